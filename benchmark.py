@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Offline Throughput Benchmark
+
+Replays synthetic Reddit profile listings (.json and old-Reddit HTML) from a local
+HTTP server, swaps Gemini for a deterministic stub client and times every stage of
+the pipeline (fetch, parse, analyze, LLM, report) for users of increasing size.
+No network access or API key is needed, so runs are comparable across commits.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --sizes 10 1000 100000 --backend html --output results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qsl
+
+# The analyzer only calls Gemini when a key is configured; the stub client never uses it
+os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+
+from main import (HttpTransport, Metrics, PersonaAnalyzer, PersonaReporter, RedditScraper,
+                  DEFAULT_SUBREDDIT_INTERESTS)
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+STAGES = ['fetch', 'parse', 'analyze', 'llm', 'report']
+
+# Items per listing page served for each backend (matches Reddit)
+JSON_PAGE_SIZE = 100
+HTML_PAGE_SIZE = 25
+
+# Synthetic content: subreddits that hit the interest taxonomy plus some that do not
+BENCH_SUBREDDITS = list(DEFAULT_SUBREDDIT_INTERESTS)[:12] + ['askreddit', 'pics', 'news', 'todayilearned']
+BENCH_WORDS = ("the a I you it this that is was not but and or so just really think know "
+               "code python game music movie book team study work money help question "
+               "great good bad love hate new old best worst why how what maybe").split()
+BENCH_EPOCH = 1752000000
+
+class SyntheticProfile:
+    """Deterministic posts and comments of one benchmark user"""
+
+    def __init__(self, username: str, size: int):
+        """
+        Args:
+            username: Benchmark username (the item count is encoded in it)
+            size: Total number of posts and comments
+        """
+        self.username = username
+        self.post_count = size // 2
+        self.comment_count = size - self.post_count
+
+    def item(self, listing: str, index: int) -> Dict[str, any]:
+        """Fields of the index-th item of a listing (newest first)"""
+        rng = random.Random(f"{self.username}/{listing}/{index}")
+        words = rng.choices(BENCH_WORDS, k=rng.randint(8, 60))
+        if rng.random() < 0.3:
+            words[-1] += '?'
+        subreddit = rng.choice(BENCH_SUBREDDITS)
+        return {
+            'subreddit': subreddit,
+            'score': rng.randint(0, 500),
+            'created_utc': BENCH_EPOCH - index * 3600,
+            'text': ' '.join(words),
+            'title': ' '.join(words[:6]).capitalize(),
+            'permalink': f"/r/{subreddit}/comments/{listing[0]}{index}/"
+        }
+
+    def count(self, listing: str) -> int:
+        return self.post_count if listing == 'submitted' else self.comment_count
+
+    def json_page(self, listing: str, start: int) -> bytes:
+        """A .json listing page starting at item start"""
+        kind = 't3' if listing == 'submitted' else 't1'
+        end = min(start + JSON_PAGE_SIZE, self.count(listing))
+        children = []
+        for index in range(start, end):
+            item = self.item(listing, index)
+            if kind == 't3':
+                data = {'title': item['title'], 'selftext': item['text'], 'subreddit': item['subreddit'],
+                        'subreddit_name_prefixed': f"r/{item['subreddit']}", 'score': item['score'],
+                        'created_utc': item['created_utc'], 'url': f"https://www.reddit.com{item['permalink']}",
+                        'name': f"t3_{index}"}
+            else:
+                data = {'body': item['text'], 'subreddit': item['subreddit'], 'score': item['score'],
+                        'created_utc': item['created_utc'], 'permalink': item['permalink'],
+                        'name': f"t1_{index}"}
+            children.append({'kind': kind, 'data': data})
+        after = f"{kind}_{end - 1}" if end < self.count(listing) else None
+        return json.dumps({'kind': 'Listing', 'data': {'after': after, 'children': children}}).encode()
+
+    def html_page(self, listing: str, start: int, page_url: str) -> bytes:
+        """An old-Reddit HTML listing page starting at item start"""
+        end = min(start + HTML_PAGE_SIZE, self.count(listing))
+        things = []
+        for index in range(start, end):
+            item = self.item(listing, index)
+            timestamp = datetime.fromtimestamp(item['created_utc'], tz=timezone.utc).isoformat()
+            if listing == 'submitted':
+                things.append(
+                    f'<div class="thing link" data-fullname="t3_{index}"><div class="score unvoted">{item["score"]}</div>'
+                    f'<a class="title" href="{item["permalink"]}">{item["title"]}</a>'
+                    f'<a class="subreddit">r/{item["subreddit"]}</a><time datetime="{timestamp}">ago</time>'
+                    f'<div class="usertext-body"><div class="md"><p>{item["text"]}</p></div></div></div>'
+                )
+            else:
+                things.append(
+                    f'<div class="thing comment" data-fullname="t1_{index}"><a class="subreddit">{item["subreddit"]}</a>'
+                    f'<span class="score unvoted">{item["score"]} points</span><time datetime="{timestamp}">ago</time>'
+                    f'<div class="usertext-body"><div class="md"><p>{item["text"]}</p></div></div>'
+                    f'<a class="bylink" href="https://old.reddit.com{item["permalink"]}">permalink</a></div>'
+                )
+        nav = ''
+        if end < self.count(listing):
+            nav = (f'<div class="nav-buttons"><span class="next-button">'
+                   f'<a href="{page_url}?count={end}&amp;after=t_{end - 1}">next</a></span></div>')
+        return (f'<html><head><title>overview for {self.username}</title></head><body>'
+                f'<div id="header">reddit</div><div class="side">sidebar</div>'
+                f'<div id="siteTable" class="sitetable linklisting">{"".join(things)}{nav}</div>'
+                f'<div class="footer">footer</div></body></html>').encode()
+
+class FixtureServer:
+    """Local HTTP server replaying synthetic /user/<name>/<listing> pages"""
+
+    def __init__(self):
+        self._profiles = {}
+        self._pages = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = server.page(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json' if '.json' in self.path else 'text/html')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def add_user(self, username: str, size: int, backend: str):
+        """Serve a synthetic profile with size items, recording its listing pages up front"""
+        profile = SyntheticProfile(username, size)
+        page_size = JSON_PAGE_SIZE if backend == 'json' else HTML_PAGE_SIZE
+        for listing in ('submitted', 'comments'):
+            for start in range(0, max(profile.count(listing), 1), page_size):
+                self._render(profile, listing, backend == 'json', start)
+        self._profiles[username] = profile
+
+    def page(self, path: str) -> Optional[bytes]:
+        """Body for a request path (pages not recorded up front are rendered on demand)"""
+        parsed = urlparse(path)
+        parts = parsed.path.strip('/').split('/')
+        if len(parts) != 3 or parts[0] != 'user' or parts[1] not in self._profiles:
+            return None
+        listing = parts[2]
+        is_json = listing.endswith('.json')
+        listing = listing[:-5] if is_json else listing
+        if listing not in ('submitted', 'comments'):
+            return None
+
+        after = dict(parse_qsl(parsed.query)).get('after')
+        start = int(after.split('_')[1]) + 1 if after else 0
+        return self._render(self._profiles[parts[1]], listing, is_json, start)
+
+    def _render(self, profile: SyntheticProfile, listing: str, is_json: bool, start: int) -> bytes:
+        key = (profile.username, listing, is_json, start)
+        with self._lock:
+            body = self._pages.get(key)
+        if body is None:
+            if is_json:
+                body = profile.json_page(listing, start)
+            else:
+                body = profile.html_page(listing, start, f"{self.url}/user/{profile.username}/{listing}")
+            with self._lock:
+                self._pages[key] = body
+        return body
+
+    def __enter__(self) -> 'FixtureServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+class StubResponse:
+    """Minimal stand-in for a genai GenerateContentResponse"""
+
+    def __init__(self, text: str, prompt_tokens: int, output_tokens: int):
+        self.text = text
+        self.usage_metadata = type('UsageMetadata', (), {
+            'prompt_token_count': prompt_tokens,
+            'candidates_token_count': output_tokens,
+            'total_token_count': prompt_tokens + output_tokens
+        })()
+
+class StubGeminiClient:
+    """Deterministic replacement for genai.Client with an optional simulated latency"""
+
+    ANALYSIS = {
+        'personality_traits': ['Curious', 'Analytical', 'Direct'],
+        'communication_style': 'Concise and informal',
+        'psychological_profile': {
+            'Motivations': 'Learning and sharing knowledge',
+            'Thinking Style': 'Analytical',
+            'Social Orientation': 'Community-oriented',
+            'Emotional Expression': 'Reserved'
+        }
+    }
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.models = self
+
+    def generate_content(self, model: str, contents: str, **kwargs) -> StubResponse:
+        """Answer single-user prompts with one analysis and multi-user prompts with one per user"""
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        usernames = [line[9:-4] for line in contents.splitlines()
+                     if line.startswith('=== USER ') and line.endswith(' ===')]
+        result = {username: self.ANALYSIS for username in usernames} if usernames else self.ANALYSIS
+        text = json.dumps(result)
+        return StubResponse(f"```json\n{text}\n```", len(contents) // 4, len(text) // 4)
+
+def run_size(server: FixtureServer, size: int, backend: str, output_dir: str,
+             llm_latency: float) -> Dict[str, any]:
+    """Profile one synthetic user of the given size and return its stage timings"""
+    username = f"bench_{size}"
+    server.add_user(username, size, backend)
+    per_listing = size - size // 2
+    page_size = JSON_PAGE_SIZE if backend == 'json' else HTML_PAGE_SIZE
+
+    metrics = Metrics()
+    scraper = RedditScraper(max_pages=per_listing // page_size + 1, max_items=per_listing,
+                            backend=backend, transport=HttpTransport(), base_urls=(server.url,),
+                            metrics=metrics)
+    analyzer = PersonaAnalyzer(client=StubGeminiClient(llm_latency), metrics=metrics)
+    reporter = PersonaReporter(metrics=metrics)
+
+    start = time.perf_counter()
+    posts = scraper.get_user_data(username)
+    persona = analyzer.analyze_user(username, posts)
+    reporter.save_report(persona, os.path.join(output_dir, f"persona_{username}.txt"))
+    total = time.perf_counter() - start
+
+    # The analyzer's CPU stages are reported together; the (stubbed) Gemini call on its own
+    seconds = {sample['labels']['stage']: sample['sum']
+               for sample in metrics.to_dict()['histograms']['stage_seconds']}
+    stages = {stage: seconds.get(stage, 0.0) for stage in STAGES}
+    stages['analyze'] = sum(seconds.get(stage, 0.0) for stage in ('heuristics', 'sample', 'citations'))
+    return {
+        'size': size,
+        'items': len(posts),
+        'stages': stages,
+        'total': total,
+        'items_per_sec': len(posts) / total if total else 0.0
+    }
+
+def print_results(results: List[Dict[str, any]]):
+    """
+    Print a table of per-stage seconds and throughput
+    
+    Fetch and parse are summed over the scraper's parallel listing threads, so they
+    can add up to more than the total wall time.
+    """
+    header = f"{'size':>8} {'items':>8} " + ' '.join(f"{stage:>9}" for stage in STAGES) + f" {'total':>9} {'items/s':>10}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        stages = ' '.join(f"{result['stages'][stage]:>9.3f}" for stage in STAGES)
+        print(f"{result['size']:>8} {result['items']:>8} {stages} {result['total']:>9.3f} {result['items_per_sec']:>10.0f}")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark for the persona pipeline")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Items (posts + comments) per synthetic user")
+    parser.add_argument('--backend', choices=['json', 'html'], default='json',
+                        help="Listing format served and scraped")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="Runs per size; the fastest run is reported")
+    parser.add_argument('--llm-latency', type=float, default=0.0,
+                        help="Seconds the stub Gemini client sleeps per request")
+    parser.add_argument('--output', metavar='FILE',
+                        help="Also write the results as JSON to FILE")
+    return parser.parse_args(argv)
+
+def main():
+    """Main function"""
+    args = parse_args()
+    results = []
+
+    with FixtureServer() as server, tempfile.TemporaryDirectory() as output_dir:
+        print(f"Serving fixtures at {server.url} ({args.backend} backend)")
+        for size in args.sizes:
+            runs = [run_size(server, size, args.backend, output_dir, args.llm_latency)
+                    for _ in range(args.repeat)]
+            results.append(min(runs, key=lambda run: run['total']))
+
+    print()
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'backend': args.backend, 'python': sys.version.split()[0], 'results': results}, f, indent=2)
+        print(f"\nResults saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -8,33 +8,598 @@ and behavioral persona based on their posting history.
 Requirements:
     pip install requests beautifulsoup4 google-genai python-dotenv textstat
 
+Optional:
+    pip install lxml            # faster HTML listing parser
+    pip install numpy           # vectorized statistics over columnar post storage
+
 """
 
 import re
+import copy
 import json
+import math
+import argparse
 import time
+import random
 import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
-from urllib.parse import urlparse, urljoin
+from bs4 import BeautifulSoup, SoupStrainer
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, field, asdict
+from enum import Enum
+from array import array
+from urllib.parse import urlparse, urljoin, urlunparse, parse_qsl, urlencode
 import os
+import sys
+import sqlite3
+import hashlib
+import uuid
+import bisect
+import heapq
+import csv
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from collections import Counter, deque
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# HTTP/2 transport (multiplexes a host's requests over one connection) when httpx and h2 are installed
+try:
+    import httpx
+    import h2  # noqa: F401
+except ImportError:
+    httpx = None
+
+# Advertise brotli only when a decoder is installed (urllib3 and httpx use either package)
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
 # Load environment variables
 load_dotenv()
 
-@dataclass
+# Profile hosts tried in order (old Reddit first, it serves the simplest pages)
+REDDIT_BASE_URLS = ("https://old.reddit.com", "https://www.reddit.com")
+
+# Crawl budget per listing (old Reddit serves 25 items per page)
+DEFAULT_MAX_PAGES = 4
+DEFAULT_MAX_ITEMS = 100
+
+# Prefer the C-backed lxml parser for HTML listings when it is installed
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+SITE_TABLE_STRAINER = SoupStrainer(id='siteTable')
+
+# (tag, class) of the elements extracted from each old Reddit "thing" div
+POST_FIELDS = {
+    'title': ('a', 'title'),
+    'subreddit': ('a', 'subreddit'),
+    'score': ('div', 'score'),
+    'time': ('time', None),
+    'content': ('div', 'usertext-body')
+}
+COMMENT_FIELDS = {
+    'content': ('div', 'usertext-body'),
+    'subreddit': ('a', 'subreddit'),
+    'score': ('span', 'score'),
+    'time': ('time', None),
+    'permalink': ('a', 'bylink')
+}
+
+# Gemini model and prompt used for personality analysis
+GEMINI_MODEL = "gemini-2.5-flash"
+PERSONA_PROMPT_TEMPLATE = """
+        Analyze the following Reddit posts and comments to create a psychological profile:
+
+        {content_text}
+
+        Please provide your analysis in the following JSON format:
+        {{
+            "personality_traits": ["trait1", "trait2", "trait3", "trait4", "trait5"],
+            "communication_style": "brief description of communication style",
+            "psychological_profile": {{
+                "Social Orientation": "description",
+                "Emotional Pattern": "description",
+                "Thinking Style": "description",
+                "Behavior Pattern": "description"
+            }}
+        }}
+
+        Focus on:
+        1. Personality traits (5-7 specific traits based on posting patterns)
+        2. Communication style (how they express themselves)
+        3. Psychological characteristics (social, emotional, cognitive patterns)
+
+        Respond with ONLY the JSON object, no additional text.
+        """
+
+BATCH_PROMPT_TEMPLATE = """
+        Analyze the Reddit posts and comments of each user below to create one psychological profile per user.
+        Each user's activity starts with a line "=== USER <username> ===".
+
+        {sections}
+
+        Respond with ONLY a JSON object keyed by the exact usernames, where each value has this format:
+        {{
+            "personality_traits": ["trait1", "trait2", "trait3", "trait4", "trait5"],
+            "communication_style": "brief description of communication style",
+            "psychological_profile": {{
+                "Social Orientation": "description",
+                "Emotional Pattern": "description",
+                "Thinking Style": "description",
+                "Behavior Pattern": "description"
+            }}
+        }}
+
+        Focus on personality traits (5-7 per user), communication style and psychological
+        characteristics, and never mix evidence between users.
+        """
+
+REDUCE_PROMPT_TEMPLATE = """
+        The following JSON list holds partial psychological profiles of ONE Reddit user, each
+        built from a different period of their posts and comments:
+
+        {content_text}
+
+        Merge them into a single profile of the user in the following JSON format:
+        {{
+            "personality_traits": ["trait1", "trait2", "trait3", "trait4", "trait5"],
+            "communication_style": "brief description of communication style",
+            "psychological_profile": {{
+                "Social Orientation": "description",
+                "Emotional Pattern": "description",
+                "Thinking Style": "description",
+                "Behavior Pattern": "description"
+            }}
+        }}
+
+        Keep 5-7 traits that are supported by several partial profiles, and describe
+        consistent patterns rather than one-off ones.
+
+        Respond with ONLY the JSON object, no additional text.
+        """
+
+# Analysis returned when Gemini's answer cannot be parsed
+LLM_PARSE_FAILED = {
+    'personality_traits': ['Unable to parse AI response'],
+    'communication_style': 'Unable to parse AI response',
+    'psychological_profile': {'Status': 'AI parsing failed'}
+}
+
+# Map-reduce analysis of deep histories
+DEFAULT_CHUNK_TOKENS = 6000
+DEFAULT_MAP_WORKERS = 4
+REDUCE_FANOUT = 16
+
+# Gemini request rate and retries on 429 / RESOURCE_EXHAUSTED
+DEFAULT_LLM_RPM = 60
+LLM_MAX_RETRIES = 5
+LLM_BACKOFF_BASE = 2.0
+LLM_BACKOFF_CAP = 60.0
+
+# Subreddit name fragment -> interest; the first fragment contained in a subreddit name wins.
+# Replace or extend it with --taxonomy / PERSONA_TAXONOMY_FILE (a JSON object in the same shape).
+DEFAULT_SUBREDDIT_INTERESTS = {
+    'gaming': 'Gaming',
+    'games': 'Gaming',
+    'technology': 'Technology',
+    'programming': 'Programming',
+    'python': 'Programming',
+    'politics': 'Politics',
+    'news': 'Current Events',
+    'worldnews': 'Current Events',
+    'science': 'Science',
+    'askreddit': 'Social Discussion',
+    'movies': 'Movies',
+    'books': 'Reading',
+    'music': 'Music',
+    'food': 'Food',
+    'cooking': 'Cooking',
+    'fitness': 'Fitness',
+    'sports': 'Sports',
+    'travel': 'Travel',
+    'photography': 'Photography',
+    'art': 'Art',
+    'history': 'History',
+    'bitcoin': 'Cryptocurrency',
+    'cryptocurrency': 'Cryptocurrency',
+    'investing': 'Finance',
+    'personalfinance': 'Finance',
+    'relationship': 'Relationships',
+    'dating': 'Dating',
+    'parenting': 'Parenting'
+}
+INTEREST_CACHE_SIZE = 100000
+
+# Citation index vocabulary handling
+INDEX_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the their them "
+    "they this to was were will with".split()
+)
+_INDEX_WORD = re.compile(r'[a-z0-9]+')
+INDEX_SUFFIXES = ('ations', 'ation', 'ness', 'ment', 'ally', 'ing', 'ies', 'ive', 'ers', 'ed', 'er', 'ly', 'es', 's')
+
+# Token budget of one user's LLM sample and the length each sampled item is cut to
+DEFAULT_SAMPLE_TOKENS = 1200
+SAMPLE_ITEM_CHARS = 400
+_SAMPLE_WORD = re.compile(r'\w+')
+
+# Approximate input token cap of one packed multi-user prompt
+DEFAULT_LLM_BATCH_TOKENS = 8000
+_STATUS_429 = re.compile(r'\b429\b')
+
+# Personas per Parquet row group
+DEFAULT_ROW_GROUP_SIZE = 1000
+
+# Metrics: exported name prefix and latency histogram bucket bounds (seconds)
+METRICS_PREFIX = "reddit_persona"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Temporal profile: days kept in the rolling daily histogram, and what counts as a burst day
+ACTIVITY_DAYS = 365
+BURST_FACTOR = 3.0
+BURST_MIN_ITEMS = 5
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Cohort percentiles reported for every feature
+COHORT_PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+# Batch mode defaults
+DEFAULT_CONCURRENCY = 8
+DEFAULT_PER_HOST = 4
+
+# HTTP transport: connect fails fast, reads allow for slow listing pages
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10.0
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Per-host politeness: sustained requests per second (Reddit allows about 100 per minute),
+# and retries of throttled (429/503) requests
+DEFAULT_HOST_RPS = 1.5
+HTTP_MAX_RETRIES = 4
+HTTP_BACKOFF_BASE = 2.0
+HTTP_BACKOFF_CAP = 120.0
+DEFAULT_ANALYSIS_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 3
+BATCH_RETRY_DELAY = 5.0
+
+# On-disk HTTP response cache size cap
+DEFAULT_HTTP_CACHE_BYTES = 256 * 1024 * 1024
+
+# LLM analysis cache expiry and size
+DEFAULT_LLM_CACHE_TTL = 7 * 24 * 3600
+DEFAULT_LLM_CACHE_ENTRIES = 10000
+
+class PostType(str, Enum):
+    """Kind of a Reddit item; compares and formats like its plain string value"""
+    POST = 'post'
+    COMMENT = 'comment'
+    
+    def __str__(self) -> str:
+        return self.value
+    
+    def __format__(self, format_spec: str) -> str:
+        return self.value.__format__(format_spec)
+
+@dataclass(frozen=True, slots=True)
 class RedditPost:
     """Data class for Reddit posts/comments"""
     content: str
     subreddit: str
     score: int
     timestamp: str
-    post_type: str  # 'post' or 'comment'
+    post_type: PostType  # 'post' or 'comment'
     url: str
     title: str = ""
+    created_utc: int = 0  # Seconds since the epoch (0 if unknown), parsed once from timestamp
+    fullname: str = ""  # Reddit's id of the item ("t3_..." posts, "t1_..." comments; "" if unknown)
+    
+    def __post_init__(self):
+        # Share one copy of each subreddit name and post type across all items
+        object.__setattr__(self, 'subreddit', sys.intern(self.subreddit))
+        if not isinstance(self.post_type, PostType):
+            object.__setattr__(self, 'post_type', PostType(self.post_type))
+        if not self.created_utc and self.timestamp:
+            object.__setattr__(self, 'created_utc', _parse_epoch(self.timestamp))
+
+# Column code of each post type in PostColumns.types
+_POST_TYPE_CODES = (PostType.POST, PostType.COMMENT)
+
+class PostColumns:
+    """Columnar storage of a user's posts: typed arrays for numbers, codes for subreddits"""
+    
+    __slots__ = ('contents', 'titles', 'urls', 'fullnames', 'timestamps', 'created', 'scores', 'types',
+                 'subreddit_codes', 'subreddits', '_subreddit_index')
+    
+    def __init__(self):
+        self.contents = []
+        self.titles = []
+        self.urls = []
+        self.fullnames = []
+        self.timestamps = []
+        self.created = array('q')
+        self.scores = array('q')
+        self.types = array('B')
+        self.subreddit_codes = array('I')
+        self.subreddits = []  # Subreddit name of each code, in first-seen order
+        self._subreddit_index = {}
+    
+    @classmethod
+    def from_posts(cls, posts: List[RedditPost]) -> 'PostColumns':
+        """Build columns from a list of posts"""
+        columns = cls()
+        for post in posts:
+            columns.append(post)
+        return columns
+    
+    def append(self, post: RedditPost):
+        """Add one post"""
+        self.append_fields(post.content, post.subreddit, post.score, post.timestamp,
+                           _POST_TYPE_CODES.index(post.post_type), post.url, post.title,
+                           post.created_utc, post.fullname)
+    
+    def append_fields(self, content: str, subreddit: str, score: int, timestamp: str, type_code: int,
+                      url: str, title: str, created_utc: int, fullname: str):
+        """Add one item from its field values (no RedditPost is built)"""
+        code = self._subreddit_index.get(subreddit)
+        if code is None:
+            code = self._subreddit_index[subreddit] = len(self.subreddits)
+            self.subreddits.append(sys.intern(subreddit))
+        self.subreddit_codes.append(code)
+        self.types.append(type_code)
+        self.scores.append(score)
+        self.contents.append(content)
+        self.titles.append(title)
+        self.urls.append(url)
+        self.fullnames.append(fullname)
+        self.timestamps.append(timestamp)
+        self.created.append(created_utc)
+    
+    def to_numpy(self) -> Dict[str, any]:
+        """Zero-copy NumPy views of the numeric columns (requires numpy)"""
+        if np is None:
+            raise ImportError("numpy is required for NumPy column views. Run: pip install numpy")
+        return {
+            'scores': np.frombuffer(self.scores, dtype=np.int64),
+            'types': np.frombuffer(self.types, dtype=np.uint8),
+            'subreddit_codes': np.frombuffer(self.subreddit_codes, dtype=np.uint32)
+        }
+    
+    def __len__(self) -> int:
+        return len(self.scores)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return RedditPost(
+            content=self.contents[index],
+            subreddit=self.subreddits[self.subreddit_codes[index]],
+            score=self.scores[index],
+            timestamp=self.timestamps[index],
+            post_type=_POST_TYPE_CODES[self.types[index]],
+            url=self.urls[index],
+            title=self.titles[index],
+            created_utc=self.created[index],
+            fullname=self.fullnames[index]
+        )
+    
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+    
+    def __getstate__(self):
+        # The subreddit lookup is rebuilt on unpickling, keeping worker messages small
+        return (self.contents, self.titles, self.urls, self.fullnames, self.timestamps, self.created,
+                self.scores, self.types, self.subreddit_codes, self.subreddits)
+    
+    def __setstate__(self, state):
+        (self.contents, self.titles, self.urls, self.fullnames, self.timestamps, self.created,
+         self.scores, self.types, self.subreddit_codes, self.subreddits) = state
+        self._subreddit_index = {name: code for code, name in enumerate(self.subreddits)}
+
+class CohortTable:
+    """
+    Items of many users in one columnar table for vectorized cohort statistics
+    
+    Only the per-item numbers the heuristics need are kept (lengths and punctuation
+    counts instead of text); users and subreddits are stored as integer codes.
+    """
+    
+    __slots__ = ('usernames', 'subreddits', 'user_codes', 'subreddit_codes', 'scores', 'types',
+                 'lengths', 'questions', 'exclamations', 'all_caps', '_user_index', '_subreddit_index')
+    
+    def __init__(self):
+        self.usernames = []  # Username of each code, in first-seen order
+        self.subreddits = []  # Subreddit name of each code, in first-seen order
+        self.user_codes = array('I')
+        self.subreddit_codes = array('I')
+        self.scores = array('q')
+        self.types = array('B')
+        self.lengths = array('q')
+        self.questions = array('I')
+        self.exclamations = array('I')
+        self.all_caps = array('B')
+        self._user_index = {}
+        self._subreddit_index = {}
+    
+    def append(self, username: str, subreddit: str, score: int, type_code: int, length: int,
+               questions: int, exclamations: int, all_caps: bool):
+        """Add one item's numbers"""
+        code = self._user_index.get(username)
+        if code is None:
+            code = self._user_index[username] = len(self.usernames)
+            self.usernames.append(username)
+        self.user_codes.append(code)
+        code = self._subreddit_index.get(subreddit)
+        if code is None:
+            code = self._subreddit_index[subreddit] = len(self.subreddits)
+            self.subreddits.append(subreddit)
+        self.subreddit_codes.append(code)
+        self.scores.append(score)
+        self.types.append(type_code)
+        self.lengths.append(length)
+        self.questions.append(questions)
+        self.exclamations.append(exclamations)
+        self.all_caps.append(all_caps)
+    
+    def to_numpy(self) -> Dict[str, any]:
+        """Zero-copy NumPy views of all columns (requires numpy)"""
+        if np is None:
+            raise ImportError("numpy is required for cohort analytics. Run: pip install numpy")
+        return {
+            'user_codes': np.frombuffer(self.user_codes, dtype=np.uint32),
+            'subreddit_codes': np.frombuffer(self.subreddit_codes, dtype=np.uint32),
+            'scores': np.frombuffer(self.scores, dtype=np.int64),
+            'types': np.frombuffer(self.types, dtype=np.uint8),
+            'lengths': np.frombuffer(self.lengths, dtype=np.int64),
+            'questions': np.frombuffer(self.questions, dtype=np.uint32),
+            'exclamations': np.frombuffer(self.exclamations, dtype=np.uint32),
+            'all_caps': np.frombuffer(self.all_caps, dtype=np.uint8)
+        }
+    
+    def __len__(self) -> int:
+        return len(self.scores)
+
+class ActivityHistogram:
+    """
+    Fixed-size temporal activity counts of one user
+    
+    Keeps an hour-of-week histogram (Monday 00:00 UTC first) and a rolling window of
+    daily counts ending on the user's latest active day. Histograms only grow by adding
+    items or merging, so refreshes update them without revisiting earlier items.
+    """
+    
+    __slots__ = ('hour_of_week', 'days', 'last_day', 'count', 'first_utc', 'last_utc')
+    
+    def __init__(self):
+        self.hour_of_week = array('I', bytes(4 * 168))
+        self.days = array('I', bytes(4 * ACTIVITY_DAYS))
+        self.last_day = 0  # Days since the epoch of the last slot in days
+        self.count = 0
+        self.first_utc = 0
+        self.last_utc = 0
+    
+    @classmethod
+    def from_posts(cls, posts: List[RedditPost]) -> 'ActivityHistogram':
+        """Build a histogram from posts (or PostColumns)"""
+        histogram = cls()
+        created = posts.created if isinstance(posts, PostColumns) else (post.created_utc for post in posts)
+        for created_utc in created:
+            histogram.add(created_utc)
+        return histogram
+    
+    def add(self, created_utc: int, count: int = 1):
+        """Count items created at an epoch second (unknown times are ignored)"""
+        if not created_utc:
+            return
+        day = created_utc // 86400
+        # The epoch (day 0) was a Thursday
+        self.hour_of_week[((day + 3) % 7) * 24 + created_utc % 86400 // 3600] += count
+        self._advance(day)
+        offset = self.last_day - day
+        if offset < ACTIVITY_DAYS:
+            self.days[ACTIVITY_DAYS - 1 - offset] += count
+        self.count += count
+        self.first_utc = min(self.first_utc or created_utc, created_utc)
+        self.last_utc = max(self.last_utc, created_utc)
+    
+    def merge(self, other: 'ActivityHistogram'):
+        """Add another histogram of the same user (e.g. the items of a refresh)"""
+        if not other.count:
+            return
+        for index, count in enumerate(other.hour_of_week):
+            self.hour_of_week[index] += count
+        self._advance(other.last_day)
+        shift = self.last_day - other.last_day
+        for index in range(max(shift, 0), ACTIVITY_DAYS):
+            self.days[index - shift] += other.days[index]
+        self.count += other.count
+        self.first_utc = min(self.first_utc or other.first_utc, other.first_utc)
+        self.last_utc = max(self.last_utc, other.last_utc)
+    
+    def _advance(self, day: int):
+        """Slide the daily window forward so that it ends on day (if day is newer)"""
+        if not self.count:
+            self.last_day = max(self.last_day, day)
+            return
+        shift = day - self.last_day
+        if shift <= 0:
+            return
+        if shift >= ACTIVITY_DAYS:
+            self.days = array('I', bytes(4 * ACTIVITY_DAYS))
+        else:
+            self.days = self.days[shift:] + array('I', bytes(4 * shift))
+        self.last_day = day
+    
+    def to_bytes(self) -> bytes:
+        """Compact fixed-size encoding for storage"""
+        header = array('q', [self.last_day, self.count, self.first_utc, self.last_utc])
+        return header.tobytes() + self.hour_of_week.tobytes() + self.days.tobytes()
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'ActivityHistogram':
+        histogram = cls()
+        header = array('q')
+        header.frombytes(data[:32])
+        histogram.last_day, histogram.count, histogram.first_utc, histogram.last_utc = header
+        histogram.hour_of_week = array('I')
+        histogram.hour_of_week.frombytes(data[32:32 + 4 * 168])
+        histogram.days = array('I')
+        histogram.days.frombytes(data[32 + 4 * 168:])
+        return histogram
+    
+    def summary(self) -> Dict[str, any]:
+        """Peak times, cadence and bursts derived from the histograms"""
+        if not self.count:
+            return {}
+        
+        peak = max(range(168), key=lambda index: self.hour_of_week[index])
+        hours = [sum(self.hour_of_week[weekday * 24 + hour] for weekday in range(7)) for hour in range(24)]
+        weekdays = [sum(self.hour_of_week[weekday * 24:weekday * 24 + 24]) for weekday in range(7)]
+        
+        active = [count for count in self.days if count]
+        per_active_day = sum(active) / len(active) if active else 0.0
+        burst_threshold = max(BURST_MIN_ITEMS, BURST_FACTOR * per_active_day)
+        
+        streak = longest_streak = 0
+        for count in self.days:
+            streak = streak + 1 if count else 0
+            longest_streak = max(longest_streak, streak)
+        
+        span_days = (self.last_utc - self.first_utc) / 86400
+        return {
+            'peak_time': f"{WEEKDAYS[peak // 24]} {peak % 24:02d}:00 UTC",
+            'peak_weekday': WEEKDAYS[max(range(7), key=weekdays.__getitem__)],
+            'peak_hour_utc': max(range(24), key=hours.__getitem__),
+            'active_days': len(active),
+            'items_per_active_day': round(per_active_day, 2),
+            'average_gap_days': round(span_days / (self.count - 1), 2) if self.count > 1 else 0.0,
+            'burst_days': sum(1 for count in active if count >= burst_threshold),
+            'max_items_per_day': max(active, default=0),
+            'longest_streak_days': longest_streak,
+            'first_seen': datetime.fromtimestamp(self.first_utc, tz=timezone.utc).date().isoformat(),
+            'last_seen': datetime.fromtimestamp(self.last_utc, tz=timezone.utc).date().isoformat()
+        }
 
 @dataclass
 class UserPersona:
@@ -47,14 +612,743 @@ class UserPersona:
     psychological_profile: Dict[str, str]
     citations: Dict[str, List[str]]
 
+@dataclass
+class PostStatistics:
+    """Aggregate statistics of a user's posts, computed in a single pass"""
+    total: int = 0
+    post_count: int = 0
+    comment_count: int = 0
+    total_score: int = 0
+    total_length: int = 0
+    questions: int = 0
+    exclamations: int = 0
+    all_caps_posts: int = 0
+    subreddit_counts: Dict[str, int] = field(default_factory=dict)
+    
+    @classmethod
+    def from_posts(cls, posts: List[RedditPost]) -> 'PostStatistics':
+        """Compute all statistics with one loop over the posts"""
+        stats = cls()
+        subreddit_counts = stats.subreddit_counts
+        for post in posts:
+            content = post.content
+            subreddit_counts[post.subreddit] = subreddit_counts.get(post.subreddit, 0) + 1
+            if post.post_type is PostType.POST:
+                stats.post_count += 1
+            elif post.post_type is PostType.COMMENT:
+                stats.comment_count += 1
+            stats.total_score += post.score
+            stats.total_length += len(content)
+            stats.questions += content.count('?')
+            stats.exclamations += content.count('!')
+            if len(content) > 10 and content.isupper():
+                stats.all_caps_posts += 1
+        stats.total = len(posts)
+        return stats
+    
+    @classmethod
+    def from_columns(cls, columns: PostColumns) -> 'PostStatistics':
+        """Compute all statistics from columnar storage, vectorized when numpy is installed"""
+        stats = cls()
+        stats.total = len(columns)
+        if np is not None and stats.total:
+            arrays = columns.to_numpy()
+            stats.total_score = int(arrays['scores'].sum())
+            stats.post_count = int(np.count_nonzero(arrays['types'] == 0))
+            counts = np.bincount(arrays['subreddit_codes'], minlength=len(columns.subreddits))
+            stats.subreddit_counts = {name: int(count) for name, count in zip(columns.subreddits, counts) if count}
+        else:
+            stats.total_score = sum(columns.scores)
+            stats.post_count = columns.types.count(0)
+            counts = [0] * len(columns.subreddits)
+            for code in columns.subreddit_codes:
+                counts[code] += 1
+            stats.subreddit_counts = {name: count for name, count in zip(columns.subreddits, counts) if count}
+        stats.comment_count = stats.total - stats.post_count
+        
+        # Character counts run over one joined string instead of item by item
+        joined = '\0'.join(columns.contents)
+        stats.total_length = len(joined) - max(stats.total - 1, 0)
+        stats.questions = joined.count('?')
+        stats.exclamations = joined.count('!')
+        stats.all_caps_posts = sum(1 for content in columns.contents if len(content) > 10 and content.isupper())
+        return stats
+    
+    @property
+    def average_score(self) -> float:
+        return self.total_score / self.total if self.total else 0
+    
+    @property
+    def average_length(self) -> float:
+        return self.total_length / self.total if self.total else 0
+    
+    def top_subreddits(self, count: int = 10) -> List[Tuple[str, int]]:
+        """Most active subreddits, ties kept in first-seen order"""
+        return sorted(self.subreddit_counts.items(), key=lambda x: x[1], reverse=True)[:count]
+
+class ProfileUnavailable(Exception):
+    """Raised when Reddit reports a profile as missing, suspended or private (HTTP 403/404)"""
+    
+    def __init__(self, message: str, status_code: int = 404):
+        super().__init__(message)
+        self.status_code = status_code
+
+class ScrapeFailed(Exception):
+    """Raised when no host gave a complete answer for a profile (network errors, throttling, 5xx)"""
+
+class AnalysisFailed(Exception):
+    """Raised when the LLM analysis of a user could not be obtained (request errors, exhausted quota)"""
+
+class Metrics:
+    """
+    Thread-safe counters and latency histograms for one run
+    
+    Series are identified by a name plus keyword labels (e.g. stage="fetch") and can be
+    exported as Prometheus text or JSON.
+    """
+    
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        Args:
+            buckets: Upper bounds of the histogram buckets
+        """
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}  # key -> [per-bucket counts (+Inf last), count, sum]
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add value to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def observe(self, name: str, value: float, **labels):
+        """Record one observation in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            histogram[0][index] += 1
+            histogram[1] += 1
+            histogram[2] += value
+    
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the wall time of the enclosed block (also when it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+    
+    def to_dict(self) -> Dict[str, any]:
+        """Snapshot as JSON-serializable data with cumulative bucket counts"""
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, list(counts), count, total) for key, (counts, count, total) in self._histograms.items()]
+        
+        result = {'counters': {}, 'histograms': {}}
+        for (name, labels), value in sorted(counters):
+            result['counters'].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        for (name, labels), counts, count, total in sorted(histograms, key=lambda item: item[0]):
+            cumulative = 0
+            buckets = {}
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                buckets['+Inf' if bound == float('inf') else str(bound)] = cumulative
+            result['histograms'].setdefault(name, []).append({
+                'labels': dict(labels), 'count': count, 'sum': total,
+                'mean': total / count if count else 0.0, 'buckets': buckets
+            })
+        return result
+    
+    def to_prometheus(self) -> str:
+        """Render in the Prometheus text exposition format"""
+        def label_text(labels: Dict[str, any], **extra) -> str:
+            labels = {**labels, **extra}
+            if not labels:
+                return ''
+            return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+        
+        snapshot = self.to_dict()
+        lines = []
+        for name, series in snapshot['counters'].items():
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name} counter")
+            for sample in series:
+                lines.append(f"{METRICS_PREFIX}_{name}{label_text(sample['labels'])} {sample['value']}")
+        for name, series in snapshot['histograms'].items():
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name} histogram")
+            for sample in series:
+                for bound, count in sample['buckets'].items():
+                    lines.append(f"{METRICS_PREFIX}_{name}_bucket{label_text(sample['labels'], le=bound)} {count}")
+                lines.append(f"{METRICS_PREFIX}_{name}_sum{label_text(sample['labels'])} {sample['sum']}")
+                lines.append(f"{METRICS_PREFIX}_{name}_count{label_text(sample['labels'])} {sample['count']}")
+        return "\n".join(lines) + "\n"
+    
+    def save(self, path: str):
+        """Write the metrics to path: JSON for a .json file, Prometheus text otherwise"""
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                json.dump(self.to_dict(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+        print(f"Metrics saved to: {path}")
+
+class HostLimiter:
+    """
+    Per-host politeness scheduler shared by all scraper threads
+    
+    Bounds the in-flight requests and the request rate of each host. The rate follows the
+    host's answers: it halves on 429/503, pauses for Retry-After, and is paced so that the
+    quota announced in x-ratelimit-remaining / x-ratelimit-reset lasts until the reset.
+    """
+    
+    def __init__(self, per_host: int = DEFAULT_PER_HOST, rate: float = DEFAULT_HOST_RPS):
+        """
+        Args:
+            per_host: Maximum in-flight requests per host
+            rate: Maximum sustained requests per second per host
+        """
+        self.per_host = per_host
+        self.rate = rate
+        self._hosts = {}
+        self._lock = threading.Lock()
+    
+    def _host(self, url: str) -> Tuple[threading.BoundedSemaphore, 'RateLimiter']:
+        host = urlparse(url).netloc
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = (threading.BoundedSemaphore(self.per_host), RateLimiter(self.rate))
+        return state
+    
+    @contextmanager
+    def slot(self, url: str):
+        """Wait for the URL's host to accept another request, then hold one of its slots"""
+        semaphore, limiter = self._host(url)
+        limiter.acquire()
+        with semaphore:
+            yield
+    
+    def pause(self, url: str, seconds: float):
+        """Hold back all requests to the URL's host for a while"""
+        self._host(url)[1].pause(seconds)
+    
+    def on_response(self, url: str, response):
+        """Adapt the host's pace to its status code and rate-limit headers"""
+        limiter = self._host(url)[1]
+        if response.status_code in (429, 503):
+            limiter.on_throttle()
+            retry_after = _retry_after_seconds(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                limiter.pause(retry_after)
+        elif response.status_code < 400:
+            limiter.on_success()
+        
+        # Reddit announces the quota left in the current window on every response
+        try:
+            remaining = float(response.headers['x-ratelimit-remaining'])
+            reset = float(response.headers['x-ratelimit-reset'])
+        except (KeyError, TypeError, ValueError):
+            return
+        if remaining < 1:
+            limiter.pause(reset)
+        else:
+            limiter.limit(remaining / max(reset, 1.0))
+
+def _wire_bytes(response) -> int:
+    """Size of a response body as transferred (compressed), else its decoded size"""
+    # httpx counts the raw bytes read; for requests, urllib3's tell() does
+    downloaded = getattr(response, 'num_bytes_downloaded', None)
+    if downloaded is None:
+        try:
+            downloaded = response.raw.tell()
+        except (AttributeError, OSError, TypeError, ValueError):
+            downloaded = None
+    if downloaded:
+        return downloaded
+    try:
+        return int(response.headers['Content-Length'])
+    except (KeyError, TypeError, ValueError):
+        return len(response.content)
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta seconds or an HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class ResponseCache:
+    """Persistent HTTP response cache keyed by URL, revalidated with ETag/Last-Modified"""
+    
+    def __init__(self, path: str, max_bytes: int = DEFAULT_HTTP_CACHE_BYTES):
+        """
+        Args:
+            path: SQLite database file holding the cached responses
+            max_bytes: Total body size kept on disk; least recently used entries are evicted
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    
+    def get(self, url: str) -> Optional[Tuple[bytes, Optional[str], Optional[str]]]:
+        """Return (body, etag, last_modified) for a cached URL and mark it as recently used"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row:
+                self._conn.execute("UPDATE responses SET accessed = ? WHERE url = ?", (time.time(), url))
+                self._conn.commit()
+        return row
+    
+    def put(self, url: str, body: bytes, etag: Optional[str], last_modified: Optional[str]):
+        """Store a response body with its validators, evicting old entries beyond the size cap"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            if old:
+                self._total_bytes -= old[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (url, body, etag, last_modified, size, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, body, etag, last_modified, len(body), time.time())
+            )
+            self._total_bytes += len(body)
+            self._evict()
+            self._conn.commit()
+    
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT url, size FROM responses ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for url, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self._total_bytes -= size
+    
+    def close(self):
+        """Close the underlying database"""
+        with self._lock:
+            self._conn.close()
+
+def item_key(post: RedditPost) -> str:
+    """
+    Stable identity of a post/comment within a user's history
+    
+    The fullname, not the URL: a link post's URL is the linked page, which other posts share.
+    """
+    return post.fullname or post.url or f"{post.post_type}:{post.subreddit}:{post.timestamp}:{post.title}"
+
+class ItemStore:
+    """Persistent per-user store of scraped posts and comments"""
+    
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite database file holding the items
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                username TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                content TEXT NOT NULL,
+                subreddit TEXT NOT NULL,
+                score INTEGER NOT NULL,
+                timestamp TEXT NOT NULL,
+                post_type TEXT NOT NULL,
+                url TEXT NOT NULL,
+                title TEXT NOT NULL,
+                created_utc INTEGER NOT NULL DEFAULT 0,
+                fullname TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (username, item_key)
+            )
+        """)
+        # Stores created before epoch timestamps and fullnames were kept get the columns added
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(items)")}
+        if 'created_utc' not in columns:
+            self._conn.execute("ALTER TABLE items ADD COLUMN created_utc INTEGER NOT NULL DEFAULT 0")
+        if 'fullname' not in columns:
+            self._conn.execute("ALTER TABLE items ADD COLUMN fullname TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS activity (
+                username TEXT PRIMARY KEY,
+                histogram BLOB NOT NULL
+            )
+        """)
+        self._conn.commit()
+    
+    def known_keys(self, username: str) -> set:
+        """Keys of all items stored for a user"""
+        with self._lock:
+            rows = self._conn.execute("SELECT item_key FROM items WHERE username = ?", (username,)).fetchall()
+        return {row[0] for row in rows}
+    
+    def add(self, username: str, posts: List[RedditPost]):
+        """
+        Merge freshly scraped items into a user's history (scores of known items are updated)
+        
+        The user's activity histogram is updated with the items not stored before.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT histogram FROM activity WHERE username = ?", (username,)).fetchone()
+            # Rows stored before items had fullnames are keyed by URL; they are re-keyed
+            # when the same item (same URL and timestamp) is scraped again
+            legacy = dict(self._conn.execute(
+                "SELECT item_key, timestamp FROM items WHERE username = ? AND fullname = '' AND item_key = url",
+                (username,)))
+            if row:
+                histogram = ActivityHistogram.from_bytes(row[0])
+                known = {key for (key,) in self._conn.execute(
+                    "SELECT item_key FROM items WHERE username = ?", (username,))}
+            else:
+                # First histogram of this user: count everything stored so far once
+                histogram = ActivityHistogram()
+                known = set()
+                for key, created_utc, timestamp in self._conn.execute(
+                        "SELECT item_key, created_utc, timestamp FROM items WHERE username = ?", (username,)):
+                    histogram.add(created_utc or _parse_epoch(timestamp))
+                    known.add(key)
+            
+            rows = []
+            rekeyed = []
+            fresh = ActivityHistogram()
+            for post in posts:
+                key = item_key(post)
+                if key != post.url and legacy.get(post.url) == post.timestamp:
+                    del legacy[post.url]
+                    rekeyed.append((username, post.url))
+                    known.add(key)
+                elif key not in known:
+                    known.add(key)
+                    fresh.add(post.created_utc)
+                rows.append((username, key, post.content, post.subreddit, post.score, post.timestamp,
+                             post.post_type.value, post.url, post.title, post.created_utc, post.fullname))
+            
+            histogram.merge(fresh)
+            
+            self._conn.executemany("DELETE FROM items WHERE username = ? AND item_key = ?", rekeyed)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO items "
+                "(username, item_key, content, subreddit, score, timestamp, post_type, url, title, created_utc, fullname) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.execute("INSERT OR REPLACE INTO activity (username, histogram) VALUES (?, ?)",
+                               (username, histogram.to_bytes()))
+            self._conn.commit()
+    
+    def load_activity(self, username: str) -> Optional[ActivityHistogram]:
+        """A user's stored activity histogram (None if the user has not been stored)"""
+        with self._lock:
+            row = self._conn.execute("SELECT histogram FROM activity WHERE username = ?", (username,)).fetchone()
+        return ActivityHistogram.from_bytes(row[0]) if row else None
+    
+    def load_columns(self, username: str) -> PostColumns:
+        """
+        Load a user's full stored history as columns (same order as load)
+        
+        Rows go straight into the column arrays, so no RedditPost objects are built.
+        """
+        type_codes = {post_type.value: code for code, post_type in enumerate(_POST_TYPE_CODES)}
+        columns = PostColumns()
+        for content, subreddit, score, timestamp, post_type, url, title, created_utc, fullname in self._rows(username):
+            columns.append_fields(content, subreddit, score, timestamp, type_codes[post_type], url, title,
+                                  created_utc or _parse_epoch(timestamp), fullname)
+        return columns
+    
+    def load(self, username: str) -> List[RedditPost]:
+        """Load a user's full stored history: posts first, then comments, newest first"""
+        return [RedditPost(content=row[0], subreddit=row[1], score=row[2], timestamp=row[3],
+                           post_type=row[4], url=row[5], title=row[6], created_utc=row[7], fullname=row[8])
+                for row in self._rows(username)]
+    
+    def _rows(self, username: str) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT content, subreddit, score, timestamp, post_type, url, title, created_utc, fullname FROM items "
+                "WHERE username = ? ORDER BY post_type DESC, timestamp DESC", (username,)
+            ).fetchall()
+    
+    def load_cohort(self, usernames: Optional[List[str]] = None) -> CohortTable:
+        """
+        Load many users' histories into one cohort table with a single query
+        
+        Lengths and punctuation counts are computed by SQLite, so item text never reaches
+        Python. All-caps detection compares ASCII case only.
+        
+        Args:
+            usernames: Users to include (every stored user if omitted)
+        """
+        query = (
+            "SELECT username, subreddit, score, post_type, length(content), "
+            "length(content) - length(replace(content, '?', '')), "
+            "length(content) - length(replace(content, '!', '')), "
+            "length(content) > 10 AND upper(content) = content AND lower(content) != content "
+            "FROM items{} ORDER BY username, post_type DESC, timestamp DESC"
+        )
+        table = CohortTable()
+        type_codes = {post_type.value: code for code, post_type in enumerate(_POST_TYPE_CODES)}
+        with self._lock:
+            if usernames is None:
+                cursor = self._conn.execute(query.format(''))
+            else:
+                self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS cohort_users (username TEXT PRIMARY KEY)")
+                self._conn.execute("DELETE FROM cohort_users")
+                self._conn.executemany("INSERT OR IGNORE INTO cohort_users VALUES (?)",
+                                       [(username,) for username in usernames])
+                cursor = self._conn.execute(query.format(
+                    " WHERE username IN (SELECT username FROM cohort_users)"))
+            for username, subreddit, score, post_type, length, questions, exclamations, all_caps in cursor:
+                table.append(username, subreddit, score, type_codes[post_type], length,
+                             questions, exclamations, all_caps)
+        return table
+    
+    def close(self):
+        """Close the underlying database"""
+        with self._lock:
+            self._conn.close()
+
+class BatchQueue:
+    """
+    Durable per-user progress of a batch run, so an interrupted run resumes where it stopped
+    
+    Users move through the states pending -> scraped -> analyzed -> reported, with a
+    checkpoint committed after every stage. Failed stages count against a per-user retry
+    budget; users that exhaust it are marked failed and skipped by later runs.
+    """
+    
+    STATES = ('pending', 'scraped', 'analyzed', 'reported', 'failed')
+    
+    def __init__(self, path: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        """
+        Args:
+            path: SQLite database file holding the progress
+            max_attempts: Failed attempts after which a user is given up on
+        """
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # One commit per checkpoint; WAL keeps those cheap without risking the file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS batch_users (
+                username TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                persona TEXT,
+                report TEXT,
+                error TEXT,
+                updated REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+    
+    def enqueue(self, usernames: List[str]) -> Dict[str, Tuple[str, int]]:
+        """
+        Add users not seen before as pending
+        
+        Returns:
+            Mapping of username to its (state, attempts) so far
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO batch_users (username, state, updated) VALUES (?, 'pending', ?)",
+                [(username, time.time()) for username in usernames]
+            )
+            self._conn.commit()
+            rows = self._conn.execute("SELECT username, state, attempts FROM batch_users").fetchall()
+        wanted = set(usernames)
+        return {username: (state, attempts) for username, state, attempts in rows if username in wanted}
+    
+    def mark_scraped(self, username: str):
+        self._checkpoint(username, 'scraped')
+    
+    def mark_analyzed(self, username: str, persona: UserPersona):
+        """Checkpoint the analysis, keeping the persona so reporting can resume without it"""
+        self._checkpoint(username, 'analyzed', persona=json.dumps(asdict(persona), ensure_ascii=False))
+    
+    def mark_reported(self, username: str, report: str):
+        self._checkpoint(username, 'reported', report=report)
+    
+    def record_failure(self, username: str, error: Exception) -> bool:
+        """
+        Count a failed attempt; the user stays in its last completed state
+        
+        Returns:
+            True if the user may be retried, False if its retry budget is exhausted
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE batch_users SET attempts = attempts + 1, error = ?, updated = ?, "
+                "state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE state END WHERE username = ?",
+                (str(error), time.time(), self.max_attempts, username)
+            )
+            self._conn.commit()
+            attempts = self._conn.execute("SELECT attempts FROM batch_users WHERE username = ?",
+                                          (username,)).fetchone()[0]
+        return attempts < self.max_attempts
+    
+    def load_persona(self, username: str) -> Optional[UserPersona]:
+        """The persona checkpointed for an analyzed user"""
+        with self._lock:
+            row = self._conn.execute("SELECT persona FROM batch_users WHERE username = ?", (username,)).fetchone()
+        return UserPersona(**json.loads(row[0])) if row and row[0] else None
+    
+    def report(self, username: str) -> Optional[str]:
+        """The saved report of a reported user"""
+        with self._lock:
+            row = self._conn.execute("SELECT report FROM batch_users WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+    
+    def counts(self) -> Dict[str, int]:
+        """Number of users in each state"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM batch_users GROUP BY state").fetchall()
+        return dict(rows)
+    
+    def reset(self):
+        """Forget all progress"""
+        with self._lock:
+            self._conn.execute("DELETE FROM batch_users")
+            self._conn.commit()
+    
+    def _checkpoint(self, username: str, state: str, **values):
+        columns = ''.join(f", {column} = ?" for column in values)
+        with self._lock:
+            self._conn.execute(f"UPDATE batch_users SET state = ?, updated = ?{columns} WHERE username = ?",
+                               (state, time.time(), *values.values(), username))
+            self._conn.commit()
+    
+    def close(self):
+        """Close the underlying database"""
+        with self._lock:
+            self._conn.close()
+
+class HttpTransport:
+    """
+    Pooled keep-alive HTTP client that can be shared between scrapers, threads and batch workers
+    
+    Uses HTTP/2 through httpx when httpx and h2 are installed, so concurrent requests to a host
+    share one connection; otherwise a requests session with a keep-alive pool per host.
+    Responses are requested compressed (gzip, and br when a brotli decoder is installed).
+    """
+    
+    def __init__(self, pool_size: int = DEFAULT_PER_HOST, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT, http2: bool = True):
+        """
+        Args:
+            pool_size: Kept-alive connections per host (HTTP/1.1) or in total (HTTP/2)
+            connect_timeout: Seconds to wait for a connection to be established
+            read_timeout: Seconds to wait for the server between bytes of a response
+            http2: Use HTTP/2 if httpx and h2 are installed
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.http2 = http2 and httpx is not None
+        headers = {'User-Agent': USER_AGENT, 'Accept-Encoding': ACCEPT_ENCODING}
+        if self.http2:
+            self._client = httpx.Client(
+                http2=True, headers=headers, follow_redirects=True,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size))
+        else:
+            self._client = requests.Session()
+            self._client.headers.update(headers)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self._client.mount('https://', adapter)
+            self._client.mount('http://', adapter)
+    
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None):
+        """
+        Issue a GET request
+        
+        Returns:
+            A requests or httpx response (both provide status_code, headers, content and raise_for_status)
+        """
+        if self.http2:
+            return self._client.get(url, headers=headers)
+        return self._client.get(url, headers=headers, timeout=self.timeout)
+    
+    def close(self):
+        """Close all pooled connections"""
+        self._client.close()
+
 class RedditScraper:
     """Scrapes Reddit user profiles"""
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+    def __init__(self, max_pages: int = DEFAULT_MAX_PAGES, max_items: int = DEFAULT_MAX_ITEMS,
+                 max_age_days: Optional[int] = None, transport: Optional[HttpTransport] = None,
+                 limiter: Optional[HostLimiter] = None, backend: str = 'json', fast_html: bool = True,
+                 cache: Optional[ResponseCache] = None, store: Optional[ItemStore] = None,
+                 parse_pool: Optional[Executor] = None, base_urls: Tuple[str, ...] = REDDIT_BASE_URLS,
+                 metrics: Optional[Metrics] = None):
+        """
+        Args:
+            max_pages: Maximum number of listing pages fetched per listing (posts/comments)
+            max_items: Maximum number of items collected per listing
+            max_age_days: Stop crawling once items older than this many days are reached
+            transport: Shared HTTP transport (a new one is created on the first request if omitted)
+            limiter: Shared per-host limit on in-flight requests
+            backend: 'json' to read Reddit's .json listings (falls back to HTML), or 'html'
+            fast_html: Parse only the listing region (#siteTable) with the fastest installed parser
+            cache: On-disk response cache used for conditional requests
+            store: Per-user item store that new activity is merged into
+            parse_pool: Process pool that listing pages are parsed in (parsed in the calling thread if omitted)
+            base_urls: Hosts whose /user/<name> profiles are tried in order
+            metrics: Run metrics that request latency, bytes, cache hits and parse times are recorded in
+        """
+        self._transport = transport
+        self._transport_lock = threading.Lock()
+        self.limiter = limiter
+        self.max_pages = max_pages
+        self.max_items = max_items
+        self.max_age_days = max_age_days
+        self.backend = backend
+        self.fast_html = fast_html
+        self.cache = cache
+        self.store = store
+        self.parse_pool = parse_pool
+        self.base_urls = base_urls
+        self.metrics = metrics or Metrics()
+    
+    @property
+    def transport(self) -> HttpTransport:
+        """HTTP transport, created on first use so that parse-only scrapers open no connections"""
+        if self._transport is None:
+            with self._transport_lock:
+                if self._transport is None:
+                    self._transport = HttpTransport()
+        return self._transport
         
     def get_user_data(self, username: str) -> List[RedditPost]:
         """
@@ -64,306 +1358,966 @@ class RedditScraper:
             username: Reddit username
             
         Returns:
-            List of RedditPost objects
+            List of RedditPost objects, or the user's full stored history as PostColumns
+            if an item store is set (analyzers take either)
+            
+        Raises:
+            ScrapeFailed: If every host failed to return a complete answer
         """
-        posts = []
+        # Items already stored end the crawl, so refreshes only fetch new activity
+        known = self.store.known_keys(username) if self.store else None
         
         # Try both old and new Reddit URLs
-        urls = [
-            f"https://old.reddit.com/user/{username}",
-            f"https://www.reddit.com/user/{username}"
-        ]
+        urls = [f"{host}/user/{username}" for host in self.base_urls]
         
         for base_url in urls:
-            try:
-                # Get posts
-                posts.extend(self._scrape_posts(base_url, username))
-                # Get comments  
-                posts.extend(self._scrape_comments(base_url, username))
-                
-                if posts:  # If we got data from this URL, break
-                    break
-                    
-            except Exception as e:
-                print(f"Error scraping {base_url}: {e}")
-                continue
+            posts, complete = self._scrape_profile(base_url, username, known)
+            
+            # A complete (even empty) answer or a 403/404 is authoritative; a failed
+            # listing falls back to the next host
+            if complete:
+                break
+        else:
+            # Partial data is not stored, so a retry crawls the missing items again
+            raise ScrapeFailed(f"No complete answer for u/{username} from {', '.join(self.base_urls)}")
+        
+        if self.store:
+            self.store.add(username, posts)
+            return self.store.load_columns(username)
                 
         return posts
     
-    def _scrape_posts(self, base_url: str, username: str) -> List[RedditPost]:
-        """Scrape user's posts"""
+    def _scrape_profile(self, base_url: str, username: str,
+                        known: Optional[set] = None) -> Tuple[List[RedditPost], bool]:
+        """
+        Fetch the posts and comments listings of one host concurrently
+        
+        Returns:
+            Tuple of (posts, complete) where complete is False if a listing failed
+        """
         posts = []
-        url = f"{base_url}/submitted"
+        complete = True
         
-        try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Parse posts from old Reddit format
-            for post_div in soup.find_all('div', class_='thing'):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(self._scrape_posts, base_url, username, known),
+                executor.submit(self._scrape_comments, base_url, username, known)
+            ]
+            for future in futures:
                 try:
-                    title_elem = post_div.find('a', class_='title')
-                    if not title_elem:
-                        continue
-                        
-                    title = title_elem.get_text(strip=True)
-                    post_url = title_elem.get('href', '')
-                    
-                    # Get subreddit
-                    subreddit_elem = post_div.find('a', class_='subreddit')
-                    subreddit = subreddit_elem.get_text(strip=True) if subreddit_elem else 'unknown'
-                    
-                    # Get score
-                    score_elem = post_div.find('div', class_='score')
-                    score = 0
-                    if score_elem:
-                        score_text = score_elem.get_text(strip=True)
-                        try:
-                            score = int(score_text) if score_text.isdigit() else 0
-                        except:
-                            score = 0
-                    
-                    # Get timestamp
-                    time_elem = post_div.find('time')
-                    timestamp = time_elem.get('datetime', '') if time_elem else ''
-                    
-                    # Get post content if available
-                    content_elem = post_div.find('div', class_='usertext-body')
-                    content = content_elem.get_text(strip=True) if content_elem else title
-                    
-                    posts.append(RedditPost(
-                        content=content,
-                        subreddit=subreddit,
-                        score=score,
-                        timestamp=timestamp,
-                        post_type='post',
-                        url=post_url,
-                        title=title
-                    ))
-                    
+                    posts.extend(future.result())
+                except ProfileUnavailable as e:
+                    print(f"Profile unavailable at {base_url}: {e}")
+                    return [], True
                 except Exception as e:
-                    print(f"Error parsing post: {e}")
+                    print(f"Error scraping {base_url}: {e}")
+                    complete = False
+        
+        return posts, complete
+    
+    def _scrape_posts(self, base_url: str, username: str, known: Optional[set] = None) -> List[RedditPost]:
+        """Scrape user's posts"""
+        return self._scrape_listing(base_url, 'submitted', self._parse_posts_page, known)
+    
+    def _scrape_comments(self, base_url: str, username: str, known: Optional[set] = None) -> List[RedditPost]:
+        """Scrape user's comments"""
+        return self._scrape_listing(base_url, 'comments', self._parse_comments_page, known)
+    
+    def _scrape_listing(self, base_url: str, listing: str, parse_page,
+                        known: Optional[set] = None) -> List[RedditPost]:
+        """
+        Crawl one listing with the configured backend
+        
+        A JSON listing that is refused (403) or cannot be decoded is scraped as HTML instead.
+        Other HTTP errors (throttling, 5xx) propagate, so the host is not sent more requests.
+        """
+        if self.backend == 'json':
+            try:
+                return self._crawl_listing(f"{base_url}/{listing}.json?limit=100&raw_json=1",
+                                           self._fetch_json_page, known)
+            except ProfileUnavailable as e:
+                # Reddit also refuses .json listings of existing profiles; only a 404, or a
+                # 403 for the profile page itself, means the profile is unavailable
+                if e.status_code != 403:
+                    raise
+                print(f"JSON listing refused, falling back to HTML: {e}")
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Error reading JSON listing, falling back to HTML: {e}")
+        
+        return self._crawl_listing(f"{base_url}/{listing}",
+                                   lambda url: self._fetch_html_page(url, parse_page), known)
+    
+    def _crawl_listing(self, url: str, fetch_page, known: Optional[set] = None) -> List[RedditPost]:
+        """
+        Follow a listing's pages until the page/item budget or time window is exhausted
+        
+        Args:
+            url: URL of the first listing page
+            fetch_page: Callable returning (items, next page URL) for a listing page URL
+            known: Keys of already stored items; reaching one of them ends the crawl
+            
+        Returns:
+            List of RedditPost objects, newest first
+            
+        Raises:
+            ProfileUnavailable: If the profile is missing or private
+            Exception: The error of a failed page (any page if an item store is set, else the first)
+        """
+        items = []
+        cutoff = None
+        if self.max_age_days is not None:
+            cutoff = int((datetime.now(timezone.utc) - timedelta(days=self.max_age_days)).timestamp())
+        
+        pages = 0
+        while url and pages < self.max_pages and len(items) < self.max_items:
+            try:
+                page_items, next_url = fetch_page(url)
+            except Exception as e:
+                # Keep the pages already crawled if a later page fails, unless they are stored:
+                # a refresh stops at the first stored item and would never fetch the rest
+                if not pages or isinstance(e, ProfileUnavailable) or self.store:
+                    raise
+                print(f"Error fetching {url}: {e}")
+                break
+            pages += 1
+            
+            if not page_items:
+                break
+            
+            # Listings are newest first, so the first item outside the window ends the crawl
+            if cutoff is not None:
+                # Items with unknown timestamps are kept
+                in_window = [item for item in page_items if not 0 < item.created_utc < cutoff]
+                window_covered = len(in_window) < len(page_items)
+                page_items = in_window
+            else:
+                window_covered = False
+            
+            # Everything after the first stored item was fetched on an earlier run
+            if known:
+                for index, item in enumerate(page_items):
+                    if item_key(item) in known:
+                        page_items = page_items[:index]
+                        window_covered = True
+                        break
+            
+            items.extend(page_items[:self.max_items - len(items)])
+            if window_covered:
+                break
+            
+            url = next_url
+        
+        return items
+    
+    def _get(self, url: str, headers: Optional[Dict[str, str]] = None):
+        """Issue a GET request through the per-host scheduler, retrying throttled (429/503) requests"""
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            if self.limiter is None:
+                response = self._send(url, headers)
+            else:
+                # Host pacing (including pauses after throttling) counts as waiting, not fetching
+                start = time.perf_counter()
+                with self.limiter.slot(url):
+                    self.metrics.observe('stage_seconds', time.perf_counter() - start, stage='wait')
+                    response = self._send(url, headers)
+                self.limiter.on_response(url, response)
+            
+            if response.status_code not in (429, 503) or attempt == HTTP_MAX_RETRIES:
+                return response
+            
+            # Wait as long as the server asks (or back off with jitter) and send the request again
+            self.metrics.inc('http_throttled_total')
+            delay = _retry_after_seconds(response.headers.get('Retry-After'))
+            if delay is None:
+                delay = min(HTTP_BACKOFF_CAP, HTTP_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"HTTP {response.status_code} from {urlparse(url).netloc}, retrying in {delay:.0f}s")
+            if self.limiter is None:
+                with self.metrics.timer('stage_seconds', stage='wait'):
+                    time.sleep(delay)
+            else:
+                # Pausing the host holds back every thread, not just this request
+                self.limiter.pause(url, delay)
+    
+    def _send(self, url: str, headers: Optional[Dict[str, str]]):
+        """Issue one GET request, timing the transport call alone"""
+        with self.metrics.timer('stage_seconds', stage='fetch'):
+            return self.transport.get(url, headers=headers)
+    
+    def _fetch(self, url: str) -> bytes:
+        """
+        Fetch a listing page body
+        
+        Raises:
+            ProfileUnavailable: On HTTP 403/404
+            requests.HTTPError / httpx.HTTPStatusError: On any other error status
+        """
+        cached = self.cache.get(url) if self.cache else None
+        headers = {}
+        if cached:
+            body, etag, last_modified = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        
+        response = self._get(url, headers=headers)
+        self.metrics.inc('http_requests_total', status=response.status_code)
+        if response.status_code == 304 and cached:
+            self.metrics.inc('http_cache_hits_total')
+            return body
+        if response.status_code in (403, 404):
+            raise ProfileUnavailable(f"HTTP {response.status_code} for {url}", response.status_code)
+        response.raise_for_status()
+        
+        # Only responses with validators can be revalidated later
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if self.cache and (etag or last_modified):
+            self.cache.put(url, response.content, etag, last_modified)
+        self.metrics.inc('http_response_bytes_total', _wire_bytes(response))
+        self.metrics.inc('http_response_decoded_bytes_total', len(response.content))
+        return response.content
+    
+    def _fetch_html_page(self, url: str, parse_page) -> Tuple[List[RedditPost], Optional[str]]:
+        """Fetch and parse an HTML listing page"""
+        content = self._fetch(url)
+        with self.metrics.timer('stage_seconds', stage='parse'):
+            if self.parse_pool is not None:
+                items, next_url = self._parse_in_pool(parse_page.__name__, content, url)
+            else:
+                items, next_url = self._parse_html_page(content, parse_page)
+        self.metrics.inc('items_parsed_total', len(items), format='html')
+        return items, next_url
+    
+    def _fetch_json_page(self, url: str) -> Tuple[List[RedditPost], Optional[str]]:
+        """Fetch a .json listing page and map its children to RedditPost objects"""
+        content = self._fetch(url)
+        with self.metrics.timer('stage_seconds', stage='parse'):
+            if self.parse_pool is not None:
+                items, next_url = self._parse_in_pool('_parse_json_page', content, url)
+            else:
+                items, next_url = self._parse_json_page(content, url)
+        self.metrics.inc('items_parsed_total', len(items), format='json')
+        return items, next_url
+    
+    def _parse_in_pool(self, parser_name: str, content: bytes, url: str) -> Tuple[List[RedditPost], Optional[str]]:
+        """Parse a page in the process pool; items come back as compact columns"""
+        columns, next_url = self.parse_pool.submit(_parse_page_task, parser_name, content, url,
+                                                   self.fast_html).result()
+        return list(columns), next_url
+    
+    def _parse_html_page(self, content: bytes, parse_page) -> Tuple[List[RedditPost], Optional[str]]:
+        """
+        Parse an HTML listing page into items and the next page URL
+        
+        The fast path only reads #siteTable, which holds all of a profile listing's items:
+        "thing" divs elsewhere on the page (promoted links, sidebar widgets) are intentionally
+        not taken for the user's activity. Pages without #siteTable are parsed in full, the
+        same way as with fast_html off.
+        """
+        if not self.fast_html:
+            soup = BeautifulSoup(content, 'html.parser')
+        else:
+            # Only build the #siteTable subtree (items and nav buttons), skipping header/sidebar/footer
+            soup = BeautifulSoup(content, HTML_PARSER, parse_only=SITE_TABLE_STRAINER)
+            if soup.find() is None:
+                soup = BeautifulSoup(content, 'html.parser')
+        return parse_page(soup), self._next_page_url(soup)
+    
+    def _parse_json_page(self, content: bytes, url: str) -> Tuple[List[RedditPost], Optional[str]]:
+        """Map a .json listing page's children to RedditPost objects"""
+        listing = json.loads(content)
+        data = listing['data']
+        
+        items = []
+        for child in data.get('children', []):
+            item = _post_from_json(child, url)
+            if item:
+                items.append(item)
+        
+        # The "after" token is the fullname of the last item; None at the end of the listing
+        after = data.get('after')
+        if not after:
+            return items, None
+        parsed = urlparse(url)
+        query = dict(parse_qsl(parsed.query))
+        query['after'] = after
+        query['count'] = str(int(query.get('count', 0)) + len(data.get('children', [])))
+        return items, urlunparse(parsed._replace(query=urlencode(query)))
+    
+    def _next_page_url(self, soup: BeautifulSoup) -> Optional[str]:
+        """Get the URL of the next listing page from old Reddit's "next" button"""
+        next_button = soup.find('span', class_='next-button')
+        if next_button:
+            next_link = next_button.find('a')
+            if next_link and next_link.get('href'):
+                return next_link['href']
+        return None
+    
+    def _find_fields(self, thing, fields: Dict[str, Tuple[str, Optional[str]]]) -> Dict[str, any]:
+        """
+        Find the first element matching each (tag, class) field spec inside a thing div
+        
+        In fast mode all fields are collected in a single walk of the subtree instead of
+        one find() per field; the elements returned are the same.
+        """
+        if not self.fast_html:
+            return {key: thing.find(tag, class_=cls) if cls else thing.find(tag)
+                    for key, (tag, cls) in fields.items()}
+        
+        found = dict.fromkeys(fields)
+        remaining = list(fields.items())
+        for elem in thing.descendants:
+            if elem.name is None:
+                continue
+            classes = elem.get('class') or ()
+            for field in remaining:
+                key, (tag, cls) = field
+                if elem.name == tag and (cls is None or cls in classes):
+                    found[key] = elem
+                    remaining.remove(field)
+                    break
+            if not remaining:
+                break
+        return found
+    
+    def _parse_posts_page(self, soup: BeautifulSoup) -> List[RedditPost]:
+        """Parse posts from a listing page"""
+        posts = []
+        
+        # Parse posts from old Reddit format
+        for post_div in soup.find_all('div', class_='thing'):
+            try:
+                fields = self._find_fields(post_div, POST_FIELDS)
+                title_elem = fields['title']
+                if not title_elem:
                     continue
                     
-        except Exception as e:
-            print(f"Error scraping posts: {e}")
-            
+                title = title_elem.get_text(strip=True)
+                post_url = title_elem.get('href', '')
+                
+                # Get subreddit
+                subreddit_elem = fields['subreddit']
+                subreddit = subreddit_elem.get_text(strip=True) if subreddit_elem else 'unknown'
+                
+                # Get score
+                score_elem = fields['score']
+                score = 0
+                if score_elem:
+                    score_text = score_elem.get_text(strip=True)
+                    try:
+                        score = int(score_text) if score_text.isdigit() else 0
+                    except:
+                        score = 0
+                
+                # Get timestamp
+                time_elem = fields['time']
+                timestamp = time_elem.get('datetime', '') if time_elem else ''
+                
+                # Get post content if available
+                content_elem = fields['content']
+                content = content_elem.get_text(strip=True) if content_elem else title
+                
+                posts.append(RedditPost(
+                    content=content,
+                    subreddit=subreddit,
+                    score=score,
+                    timestamp=timestamp,
+                    post_type=PostType.POST,
+                    url=post_url,
+                    title=title,
+                    fullname=post_div.get('data-fullname', '')
+                ))
+                
+            except Exception as e:
+                print(f"Error parsing post: {e}")
+                continue
+                
         return posts
     
-    def _scrape_comments(self, base_url: str, username: str) -> List[RedditPost]:
-        """Scrape user's comments"""
+    def _parse_comments_page(self, soup: BeautifulSoup) -> List[RedditPost]:
+        """Parse comments from a listing page"""
         comments = []
-        url = f"{base_url}/comments"
         
-        try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Parse comments from old Reddit format
-            for comment_div in soup.find_all('div', class_='thing'):
-                try:
-                    # Get comment content
-                    content_elem = comment_div.find('div', class_='usertext-body')
-                    if not content_elem:
-                        continue
-                        
-                    content = content_elem.get_text(strip=True)
-                    
-                    # Get subreddit
-                    subreddit_elem = comment_div.find('a', class_='subreddit')
-                    subreddit = subreddit_elem.get_text(strip=True) if subreddit_elem else 'unknown'
-                    
-                    # Get score
-                    score_elem = comment_div.find('span', class_='score')
-                    score = 0
-                    if score_elem:
-                        score_text = score_elem.get_text(strip=True)
-                        try:
-                            score = int(re.findall(r'\d+', score_text)[0]) if re.findall(r'\d+', score_text) else 0
-                        except:
-                            score = 0
-                    
-                    # Get timestamp
-                    time_elem = comment_div.find('time')
-                    timestamp = time_elem.get('datetime', '') if time_elem else ''
-                    
-                    # Get comment URL
-                    permalink_elem = comment_div.find('a', class_='bylink')
-                    comment_url = permalink_elem.get('href', '') if permalink_elem else ''
-                    
-                    comments.append(RedditPost(
-                        content=content,
-                        subreddit=subreddit,
-                        score=score,
-                        timestamp=timestamp,
-                        post_type='comment',
-                        url=comment_url,
-                        title=""
-                    ))
-                    
-                except Exception as e:
-                    print(f"Error parsing comment: {e}")
+        # Parse comments from old Reddit format
+        for comment_div in soup.find_all('div', class_='thing'):
+            try:
+                # Get comment content
+                fields = self._find_fields(comment_div, COMMENT_FIELDS)
+                content_elem = fields['content']
+                if not content_elem:
                     continue
                     
-        except Exception as e:
-            print(f"Error scraping comments: {e}")
-            
+                content = content_elem.get_text(strip=True)
+                
+                # Get subreddit
+                subreddit_elem = fields['subreddit']
+                subreddit = subreddit_elem.get_text(strip=True) if subreddit_elem else 'unknown'
+                
+                # Get score
+                score_elem = fields['score']
+                score = 0
+                if score_elem:
+                    score_text = score_elem.get_text(strip=True)
+                    try:
+                        score = int(re.findall(r'\d+', score_text)[0]) if re.findall(r'\d+', score_text) else 0
+                    except:
+                        score = 0
+                
+                # Get timestamp
+                time_elem = fields['time']
+                timestamp = time_elem.get('datetime', '') if time_elem else ''
+                
+                # Get comment URL
+                permalink_elem = fields['permalink']
+                comment_url = permalink_elem.get('href', '') if permalink_elem else ''
+                
+                comments.append(RedditPost(
+                    content=content,
+                    subreddit=subreddit,
+                    score=score,
+                    timestamp=timestamp,
+                    post_type=PostType.COMMENT,
+                    url=comment_url,
+                    title="",
+                    fullname=comment_div.get('data-fullname', '')
+                ))
+                
+            except Exception as e:
+                print(f"Error parsing comment: {e}")
+                continue
+                
         return comments
 
-class PersonaAnalyzer:
-    """Analyzes Reddit data to create user personas"""
+def _post_from_json(child: Dict[str, any], listing_url: str) -> Optional[RedditPost]:
+    """
+    Map a .json listing child to a RedditPost
     
-    def __init__(self):
-        self.gemini_api_key = os.getenv('GEMINI_API_KEY')
-        if not self.gemini_api_key:
-            print("Warning: Gemini API key not found. Using basic analysis only.")
+    Subreddit names follow the HTML scraper: "r/name" for posts, "name" for comments.
+    """
+    kind = child.get('kind')
+    data = child.get('data', {})
+    timestamp = ''
+    created_utc = int(data.get('created_utc') or 0)
+    if created_utc:
+        timestamp = datetime.fromtimestamp(created_utc, tz=timezone.utc).isoformat()
     
-    #Analyze user's posts to create a persona
-    def analyze_user(self, username: str, posts: List[RedditPost]) -> UserPersona:
-        if not posts:
-            return self._create_empty_persona(username)
-            
-        # Basic analysis
-        activity_patterns = self._analyze_activity_patterns(posts)
-        interests = self._analyze_interests(posts)
+    if kind == 't3':
+        title = data.get('title', '')
+        return RedditPost(
+            content=data.get('selftext') or title,
+            subreddit=data.get('subreddit_name_prefixed') or 'unknown',
+            score=int(data.get('score') or 0),
+            timestamp=timestamp,
+            post_type=PostType.POST,
+            url=data.get('url', ''),
+            title=title,
+            created_utc=created_utc,
+            fullname=data.get('name', '')
+        )
+    if kind == 't1':
+        if not data.get('body'):
+            return None
+        return RedditPost(
+            content=data['body'],
+            subreddit=data.get('subreddit') or 'unknown',
+            score=int(data.get('score') or 0),
+            timestamp=timestamp,
+            post_type=PostType.COMMENT,
+            url=urljoin(listing_url, data.get('permalink', '')),
+            title="",
+            created_utc=created_utc,
+            fullname=data.get('name', '')
+        )
+    return None
+
+def _format_citation(post: RedditPost) -> str:
+    """Format a post as a citation line"""
+    return f"[{post.post_type}] in r/{post.subreddit}: \"{post.content[:100]}...\""
+
+@lru_cache(maxsize=65536)
+def _index_term(word: str) -> Optional[str]:
+    """Lightly stemmed index term of a lowercased word, or None for stopwords"""
+    if word in INDEX_STOPWORDS or len(word) < 2:
+        return None
+    for suffix in INDEX_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+def _index_terms(text: str) -> List[str]:
+    """Lowercased, lightly stemmed terms of a text, without stopwords"""
+    terms = map(_index_term, _INDEX_WORD.findall(text.lower()))
+    return [term for term in terms if term]
+
+def _sample_line(post: RedditPost) -> str:
+    """Format one post for the LLM sample"""
+    if len(post.content) > SAMPLE_ITEM_CHARS:
+        return f"[{post.post_type}] r/{post.subreddit.replace('r/', '')}: {post.content[:SAMPLE_ITEM_CHARS]}..."
+    return f"[{post.post_type}] r/{post.subreddit.replace('r/', '')}: {post.content}"
+
+# _SIMHASH_LANES[position][byte] spreads the bits of one digest byte into 16-bit counter lanes
+_SIMHASH_LANES = [
+    [sum(1 << (16 * (8 * position + bit)) for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+    for position in range(8)
+]
+
+def _simhash(words: List[str]) -> int:
+    """64-bit SimHash of a text's word bigrams (single words for very short texts)"""
+    features = [' '.join(words[i:i + 2]) for i in range(len(words) - 1)] or words
+    
+    # Count set bits per position for all features at once: each hash bit adds to its own 16-bit lane
+    lanes = 0
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+        for position, byte in enumerate(digest):
+            lanes += _SIMHASH_LANES[position][byte]
+    
+    # A bit is set when more than half of the features have it set
+    threshold = len(features) // 2
+    return sum(1 << bit for bit in range(64) if (lanes >> (16 * bit)) & 0xFFFF > threshold)
+
+def select_sample(posts: List[RedditPost], token_budget: int = DEFAULT_SAMPLE_TOKENS) -> List[RedditPost]:
+    """
+    Pick a representative, token-bounded sample of a user's posts for the LLM
+    
+    Items are stratified by subreddit and by quarter of the user's timeline, and each stratum
+    contributes its most informative items in turn until the token budget is used up.
+    Near-duplicates of items already taken are skipped; only items that fit the budget are
+    SimHashed, so the cost of deduplication follows the sample size, not the history size.
+    
+    Args:
+        posts: User's posts and comments
+        token_budget: Approximate token budget of the formatted sample
         
-        # Advanced analysis using LLM if available
-        if self.gemini_api_key:
-            llm_analysis = self._llm_analyze_personality(posts)
-            personality_traits = llm_analysis.get('personality_traits', [])
-            communication_style = llm_analysis.get('communication_style', '')
-            psychological_profile = llm_analysis.get('psychological_profile', {})
-        else:
-            personality_traits = self._basic_personality_analysis(posts)
-            communication_style = self._analyze_communication_style(posts)
-            psychological_profile = self._basic_psychological_profile(posts)
+    Returns:
+        Selected posts in their original order
+    """
+    candidates = []
+    for index, post in enumerate(posts):
+        # Only the part that would be sent matters for scoring and duplicate detection
+        words = _SAMPLE_WORD.findall(post.content[:SAMPLE_ITEM_CHARS].lower())
+        if not words:
+            continue
         
-        # Generate citations
-        citations = self._generate_citations(posts, personality_traits, interests)
+        # Prefer varied, substantial and well-received content
+        informativeness = min(len(set(words)), 80) + math.log1p(max(post.score, 0))
+        candidates.append((index, post, words, informativeness))
+    
+    # Stratify by subreddit and timeline quarter
+    by_time = sorted(range(len(candidates)), key=lambda i: candidates[i][1].timestamp)
+    quarter = {position: rank * 4 // len(candidates) for rank, position in enumerate(by_time)}
+    strata = {}
+    for position, (index, post, words, informativeness) in enumerate(candidates):
+        strata.setdefault((post.subreddit, quarter[position]), []).append((informativeness, index, post, words))
+    ordered_strata = sorted(strata.values(), key=len, reverse=True)
+    for stratum in ordered_strata:
+        stratum.sort(key=lambda item: item[0])
+    
+    # Round-robin over strata, best item first, until the budget is spent
+    selected = []
+    bands = {}
+    remaining = token_budget
+    while remaining > 0 and ordered_strata:
+        for stratum in list(ordered_strata):
+            informativeness, index, post, words = stratum.pop()
+            tokens = _estimate_tokens(_sample_line(post))
+            if tokens <= remaining:
+                # Skip near-duplicates; SimHashes within 3 bits must share one of four 16-bit bands
+                fingerprint = _simhash(words)
+                keys = [(band, fingerprint >> (band * 16) & 0xFFFF) for band in range(4)]
+                if not any(bin(fingerprint ^ other).count('1') <= 3 for key in keys for other in bands.get(key, ())):
+                    for key in keys:
+                        bands.setdefault(key, []).append(fingerprint)
+                    selected.append((index, post))
+                    remaining -= tokens
+            if not stratum:
+                ordered_strata.remove(stratum)
+    
+    return [post for index, post in sorted(selected, key=lambda item: item[0])]
+
+def _is_rate_limited(error: Exception) -> bool:
+    """Check whether a Gemini error means the request quota is exhausted"""
+    # Errors without a status code carry it in the message; bare digits (e.g. in a request id) do not count
+    message = str(error)
+    return (getattr(error, 'code', None) == 429 or 'RESOURCE_EXHAUSTED' in message
+            or _STATUS_429.search(message) is not None)
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt fragment (about four characters per token)"""
+    return len(text) // 4 + 1
+
+def _parse_epoch(timestamp: str) -> int:
+    """Seconds since the epoch of an ISO timestamp (0 if missing or unparseable)"""
+    if not timestamp:
+        return 0
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except ValueError:
+        return 0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+class RateLimiter:
+    """Thread-safe token bucket whose rate backs off on throttling and recovers on success"""
+    
+    def __init__(self, rate: float, burst: int = 1, min_rate: Optional[float] = None):
+        """
+        Args:
+            rate: Maximum sustained requests per second
+            burst: Number of requests that may be sent back to back
+            min_rate: Lowest rate the limiter backs off to (defaults to rate / 16)
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 16
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+    
+    def on_throttle(self):
+        """Halve the rate after a 429 / RESOURCE_EXHAUSTED answer"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+    
+    def on_success(self):
+        """Recover the rate gradually after successful requests"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+    
+    def pause(self, seconds: float):
+        """Send nothing for the given time (e.g. a server's Retry-After)"""
+        with self._lock:
+            # Refilling starts at the end of the pause, so acquire() waits it out
+            until = time.monotonic() + seconds
+            if until > self._updated:
+                self._tokens = 0.0
+                self._updated = until
+    
+    def limit(self, rate: float):
+        """Lower the current rate to a server-announced quota (on_success recovers it later)"""
+        with self._lock:
+            self.rate = max(min(self.rate, rate), 1e-3)
+
+class InterestMatcher:
+    """
+    Maps subreddit names to interests with one Aho-Corasick automaton over all taxonomy keys
+    
+    A subreddit matches every key it contains; the key listed first in the taxonomy wins.
+    Lookups are memoized, so a matcher shared across a batch resolves each subreddit once.
+    """
+    
+    def __init__(self, taxonomy: Dict[str, str]):
+        """
+        Args:
+            taxonomy: Ordered mapping of subreddit name fragment to interest
+        """
+        self.taxonomy = dict(taxonomy)
+        self.interests = list(taxonomy.values())
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [None]  # Highest-priority key ending in each state (following fail links)
         
-        return UserPersona(
-            username=username,
-            personality_traits=personality_traits,
-            interests=interests,
-            communication_style=communication_style,
-            activity_patterns=activity_patterns,
-            psychological_profile=psychological_profile,
-            citations=citations
-        )
+        for priority, key in enumerate(taxonomy):
+            state = 0
+            for char in key.lower():
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                    self._goto[state][char] = next_state
+                state = next_state
+            if self._best[state] is None:
+                self._best[state] = priority
+        
+        # Breadth-first so every fail target is complete before it is used
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail if fail != next_state else 0
+                inherited = self._best[self._fail[next_state]]
+                if inherited is not None and (self._best[next_state] is None or inherited < self._best[next_state]):
+                    self._best[next_state] = inherited
+        
+        self.match = lru_cache(maxsize=INTEREST_CACHE_SIZE)(self._match)
     
-    def _analyze_activity_patterns(self, posts: List[RedditPost]) -> Dict[str, any]:
-        """Analyze user's activity patterns"""
-        if not posts:
-            return {}
+    def __reduce__(self):
+        # The automaton and memo are rebuilt from the taxonomy, e.g. in worker processes
+        return (InterestMatcher, (self.taxonomy,))
+    
+    @classmethod
+    def from_file(cls, path: str) -> 'InterestMatcher':
+        """Load a taxonomy from a JSON object of subreddit fragment -> interest"""
+        with open(path, 'r', encoding='utf-8') as f:
+            taxonomy = json.load(f)
+        if not isinstance(taxonomy, dict):
+            raise ValueError(f"Taxonomy file {path} must contain a JSON object")
+        return cls(taxonomy)
+    
+    def _match(self, subreddit: str) -> Optional[str]:
+        """Return the interest of the highest-priority key contained in the subreddit name"""
+        goto = self._goto
+        fail = self._fail
+        state = 0
+        best = None
+        for char in subreddit.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            priority = self._best[state]
+            if priority is not None and (best is None or priority < best):
+                best = priority
+        return self.interests[best] if best is not None else None
+
+class PostIndex:
+    """Inverted index over a user's posts, ranked with BM25, for citation lookup"""
+    
+    # BM25 term-frequency saturation and length normalization
+    K1 = 1.2
+    B = 0.75
+    
+    def __init__(self, posts: List[RedditPost]):
+        """
+        Args:
+            posts: Posts (list or PostColumns) to index; search results are positions in this list
+        """
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.doc_lengths = array('I')
+        if isinstance(posts, PostColumns):
+            texts = zip(posts.contents, (posts.subreddits[code] for code in posts.subreddit_codes))
+        else:
+            texts = ((post.content, post.subreddit) for post in posts)
+        for doc_id, (content, subreddit) in enumerate(texts):
+            # Count raw words first (in C), then normalize each distinct word once
+            words = Counter(_INDEX_WORD.findall(content.lower()))
+            # Subreddit terms count double so posts in a matching community rank first
+            for word in _INDEX_WORD.findall(subreddit.replace('r/', '').lower()):
+                words[word] += 2
             
-        subreddit_counts = {}
-        post_count = 0
-        comment_count = 0
-        total_score = 0
+            frequencies = {}
+            for word, frequency in words.items():
+                term = _index_term(word)
+                if term:
+                    frequencies[term] = frequencies.get(term, 0) + frequency
+            self.doc_lengths.append(sum(frequencies.values()))
+            for term, frequency in frequencies.items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+        self.average_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0
+    
+    def search(self, query: str, limit: int = 3, seeds: Optional[List[int]] = None) -> List[int]:
+        """
+        Return the ids of the best matching posts for a query, most relevant first
         
-        for post in posts:
-            # Count by subreddit
-            subreddit_counts[post.subreddit] = subreddit_counts.get(post.subreddit, 0) + 1
-            
-            # Count by type
-            if post.post_type == 'post':
-                post_count += 1
-            else:
-                comment_count += 1
-                
-            # Sum scores
-            total_score += post.score
+        Seed posts (e.g. those of the subreddits an interest was derived from) rank ahead of
+        all other matches, ordered by their own relevance.
+        """
+        total_docs = len(self.doc_lengths)
+        scores = {}
+        for term in set(_index_terms(query)):
+            frequencies = self.postings.get(term)
+            if not frequencies:
+                continue
+            idf = math.log(1 + (total_docs - len(frequencies) + 0.5) / (len(frequencies) + 0.5))
+            for doc_id, frequency in frequencies.items():
+                norm = self.K1 * (1 - self.B + self.B * self.doc_lengths[doc_id] / self.average_length)
+                scores[doc_id] = scores.get(doc_id, 0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
         
-        # Most active subreddits
-        top_subreddits = sorted(subreddit_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+        # Ties keep the original post order
+        ranked = sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))
+        if seeds:
+            seeded = heapq.nsmallest(limit, seeds, key=lambda doc_id: (-scores.get(doc_id, 0), doc_id))
+            ranked = seeded + [doc_id for doc_id in ranked if doc_id not in seeded]
+        return ranked[:limit]
+
+class LLMCache:
+    """Persistent cache of parsed LLM analyses with TTL and size-bounded eviction"""
+    
+    def __init__(self, path: str, ttl_seconds: float = DEFAULT_LLM_CACHE_TTL,
+                 max_entries: int = DEFAULT_LLM_CACHE_ENTRIES):
+        """
+        Args:
+            path: SQLite database file holding the cached analyses
+            ttl_seconds: Age after which an entry is no longer served
+            max_entries: Number of entries kept; least recently used entries are evicted
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+    
+    @staticmethod
+    def make_key(model: str, prompt_template: str, sample: str) -> str:
+        """Hash the model name, prompt template and sample into a cache key"""
+        digest = hashlib.sha256()
+        for part in (model, prompt_template, sample):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, any]]:
+        """Return the cached analysis for a key, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM analyses WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE analyses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+    
+    def put(self, key: str, value: Dict[str, any]):
+        """Store an analysis, dropping expired and least recently used entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            self._conn.execute("DELETE FROM analyses WHERE created < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM analyses WHERE key IN ("
+                "SELECT key FROM analyses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+    
+    def close(self):
+        """Close the underlying database"""
+        with self._lock:
+            self._conn.close()
+
+def load_interest_matcher(path: Optional[str] = None) -> InterestMatcher:
+    """Build the interest matcher from a taxonomy file, PERSONA_TAXONOMY_FILE or the built-in taxonomy"""
+    path = path or os.getenv('PERSONA_TAXONOMY_FILE')
+    if path:
+        return InterestMatcher.from_file(path)
+    return InterestMatcher(DEFAULT_SUBREDDIT_INTERESTS)
+
+class HeuristicAnalyzer:
+    """Rule-based persona features (no LLM); cheap to rebuild in worker processes"""
+    
+    def __init__(self, interest_matcher: Optional[InterestMatcher] = None):
+        """
+        Args:
+            interest_matcher: Subreddit to interest matcher (loaded from the taxonomy if omitted)
+        """
+        self.interest_matcher = interest_matcher or load_interest_matcher()
+    
+    def heuristic_profile(self, posts: List[RedditPost], basic: bool = True) -> Tuple[Dict[str, any], List[str], Optional[Tuple[List[str], str, Dict[str, str]]]]:
+        """
+        Compute the statistics-based part of a persona in one pass over the posts
+        
+        Args:
+            posts: Posts as a list or PostColumns
+            basic: Also derive personality traits, communication style and profile heuristically
+            
+        Returns:
+            Tuple of (activity patterns, interests, (traits, style, profile) or None)
+        """
+        if isinstance(posts, PostColumns):
+            stats = PostStatistics.from_columns(posts)
+        else:
+            stats = PostStatistics.from_posts(posts)
+        activity_patterns = self._analyze_activity_patterns(stats)
+        interests = self._analyze_interests(stats)
+        if not basic:
+            return activity_patterns, interests, None
+        return activity_patterns, interests, (self._basic_personality_analysis(stats),
+                                              self._analyze_communication_style(stats),
+                                              self._basic_psychological_profile(stats))
+    
+    def _analyze_activity_patterns(self, stats: PostStatistics) -> Dict[str, any]:
+        """Analyze user's activity patterns"""
+        if not stats.total:
+            return {}
         
         return {
-            'total_posts': post_count,
-            'total_comments': comment_count,
-            'total_score': total_score,
-            'average_score': total_score / len(posts) if posts else 0,
-            'top_subreddits': top_subreddits,
-            'subreddit_diversity': len(subreddit_counts)
+            'total_posts': stats.post_count,
+            'total_comments': stats.total - stats.post_count,
+            'total_score': stats.total_score,
+            'average_score': stats.average_score,
+            'top_subreddits': stats.top_subreddits(10),
+            'subreddit_diversity': len(stats.subreddit_counts)
         }
     
-    def _analyze_interests(self, posts: List[RedditPost]) -> List[str]:
+    def _analyze_interests(self, stats: PostStatistics) -> List[str]:
         """Analyze user's interests based on subreddits and content"""
         interests = []
         
-        # Get interests from subreddits
-        subreddit_counts = {}
-        for post in posts:
-            subreddit_counts[post.subreddit] = subreddit_counts.get(post.subreddit, 0) + 1
-        
         # Top subreddits indicate interests
-        top_subreddits = sorted(subreddit_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+        top_subreddits = stats.top_subreddits(10)
         
         # Map subreddits to interests
-        subreddit_to_interest = {
-            'gaming': 'Gaming',
-            'games': 'Gaming',
-            'technology': 'Technology',
-            'programming': 'Programming',
-            'python': 'Programming',
-            'politics': 'Politics',
-            'news': 'Current Events',
-            'worldnews': 'Current Events',
-            'science': 'Science',
-            'askreddit': 'Social Discussion',
-            'movies': 'Movies',
-            'books': 'Reading',
-            'music': 'Music',
-            'food': 'Food',
-            'cooking': 'Cooking',
-            'fitness': 'Fitness',
-            'sports': 'Sports',
-            'travel': 'Travel',
-            'photography': 'Photography',
-            'art': 'Art',
-            'history': 'History',
-            'bitcoin': 'Cryptocurrency',
-            'cryptocurrency': 'Cryptocurrency',
-            'investing': 'Finance',
-            'personalfinance': 'Finance',
-            'relationship': 'Relationships',
-            'dating': 'Dating',
-            'parenting': 'Parenting'
-        }
-        
         for subreddit, count in top_subreddits:
-            subreddit_lower = subreddit.lower()
-            for key, interest in subreddit_to_interest.items():
-                if key in subreddit_lower:
-                    if interest not in interests:
-                        interests.append(interest)
-                    break
-            else:
-                # If no match, use subreddit name as interest
-                if subreddit not in ['unknown', 'AskReddit'] and len(interests) < 15:
-                    interests.append(subreddit.replace('r/', '').title())
+            interest = self._subreddit_interest(subreddit)
+            if interest and interest not in interests and len(interests) < 15:
+                interests.append(interest)
         
         return interests[:10]  # Limit to top 10 interests
     
-    def _basic_personality_analysis(self, posts: List[RedditPost]) -> List[str]:
+    def _subreddit_interest(self, subreddit: str) -> Optional[str]:
+        """Interest a subreddit stands for: its taxonomy match, else its own name"""
+        interest = self.interest_matcher.match(subreddit)
+        if interest:
+            return interest
+        if subreddit not in ['unknown', 'AskReddit']:
+            return subreddit.replace('r/', '').title()
+        return None
+    
+    def _basic_personality_analysis(self, stats: PostStatistics) -> List[str]:
         """Basic personality analysis without LLM"""
         traits = []
         
-        if not posts:
+        if not stats.total:
             return traits
             
         # Analyze posting patterns
-        total_posts = len(posts)
-        total_score = sum(post.score for post in posts)
-        avg_score = total_score / total_posts if total_posts > 0 else 0
+        total_posts = stats.total
+        avg_score = stats.average_score
         
         # Analyze content length
-        avg_content_length = sum(len(post.content) for post in posts) / total_posts
+        avg_content_length = stats.average_length
         
         # Analyze subreddit diversity
-        unique_subreddits = len(set(post.subreddit for post in posts))
-        subreddit_diversity = unique_subreddits / total_posts if total_posts > 0 else 0
+        unique_subreddits = len(stats.subreddit_counts)
+        subreddit_diversity = unique_subreddits / total_posts
         
         # Infer traits
         if avg_score > 50:
@@ -386,7 +2340,7 @@ class PersonaAnalyzer:
             traits.append("Specialized interests")
         
         # Analyze engagement patterns
-        comment_ratio = sum(1 for post in posts if post.post_type == 'comment') / total_posts
+        comment_ratio = stats.comment_count / total_posts
         if comment_ratio > 0.8:
             traits.append("Active commenter")
         elif comment_ratio > 0.5:
@@ -396,22 +2350,20 @@ class PersonaAnalyzer:
         
         return traits
     
-    def _analyze_communication_style(self, posts: List[RedditPost]) -> str:
+    def _analyze_communication_style(self, stats: PostStatistics) -> str:
         """Analyze user's communication style"""
-        if not posts:
+        if not stats.total:
             return "Unknown communication style"
         
         # Analyze text characteristics
-        total_length = sum(len(post.content) for post in posts)
-        avg_length = total_length / len(posts)
+        avg_length = stats.average_length
         
         # Count question marks and exclamation points
-        questions = sum(post.content.count('?') for post in posts)
-        exclamations = sum(post.content.count('!') for post in posts)
+        questions = stats.questions
+        exclamations = stats.exclamations
         
         # Analyze capitalization
-        all_caps_posts = sum(1 for post in posts if post.content.isupper() and len(post.content) > 10)
-        caps_ratio = all_caps_posts / len(posts)
+        caps_ratio = stats.all_caps_posts / stats.total
         
         # Determine style
         if avg_length > 500:
@@ -421,10 +2373,10 @@ class PersonaAnalyzer:
         else:
             style = "Brief and concise"
         
-        if questions > len(posts) * 0.3:
+        if questions > stats.total * 0.3:
             style += ", inquisitive"
         
-        if exclamations > len(posts) * 0.2:
+        if exclamations > stats.total * 0.2:
             style += ", enthusiastic"
         
         if caps_ratio > 0.1:
@@ -432,16 +2384,16 @@ class PersonaAnalyzer:
         
         return style
     
-    def _basic_psychological_profile(self, posts: List[RedditPost]) -> Dict[str, str]:
+    def _basic_psychological_profile(self, stats: PostStatistics) -> Dict[str, str]:
         """Basic psychological profiling without LLM"""
         profile = {}
         
-        if not posts:
+        if not stats.total:
             return profile
         
         # Analyze engagement level
-        total_posts = len(posts)
-        avg_score = sum(post.score for post in posts) / total_posts
+        total_posts = stats.total
+        avg_score = stats.average_score
         
         if total_posts > 100:
             profile['Activity Level'] = 'Highly active'
@@ -459,7 +2411,7 @@ class PersonaAnalyzer:
             profile['Social Validation'] = 'Low engagement seeker'
         
         # Analyze content diversity
-        unique_subreddits = len(set(post.subreddit for post in posts))
+        unique_subreddits = len(stats.subreddit_counts)
         if unique_subreddits > 20:
             profile['Interest Breadth'] = 'Very diverse interests'
         elif unique_subreddits > 5:
@@ -469,128 +2421,443 @@ class PersonaAnalyzer:
         
         return profile
     
+    def _generate_citations(self, posts: List[RedditPost], traits: List[str], interests: List[str]) -> Dict[str, List[str]]:
+        """Generate citations for personality traits and interests"""
+        citations = {}
+        index = PostIndex(posts)
+        
+        # Posts of the subreddits each interest was derived from; their names rarely contain
+        # the interest as a word (r/learnprogramming -> Programming)
+        if isinstance(posts, PostColumns):
+            subreddits = (posts.subreddits[code] for code in posts.subreddit_codes)
+        else:
+            subreddits = (post.subreddit for post in posts)
+        sources = {}
+        for doc_id, subreddit in enumerate(subreddits):
+            sources.setdefault(self._subreddit_interest(subreddit), []).append(doc_id)
+        
+        # Cite the most relevant posts for interests, from their own subreddits first
+        for interest in interests:
+            doc_ids = index.search(interest, limit=3, seeds=sources.get(interest))
+            citations[f"Interest: {interest}"] = [_format_citation(posts[doc_id]) for doc_id in doc_ids]
+        
+        # Cite the most relevant posts for traits, falling back to the first posts as general evidence
+        for trait in traits:
+            doc_ids = index.search(trait, limit=3) or range(min(3, len(posts)))
+            citations[f"Trait: {trait}"] = [_format_citation(posts[doc_id]) for doc_id in doc_ids]
+        
+        return citations
+
+class PersonaAnalyzer(HeuristicAnalyzer):
+    """Analyzes Reddit data to create user personas"""
+    
+    def __init__(self, llm_cache: Optional[LLMCache] = None, rate_limiter: Optional[RateLimiter] = None,
+                 client=None, sample_tokens: int = DEFAULT_SAMPLE_TOKENS, map_reduce: bool = False,
+                 chunk_tokens: int = DEFAULT_CHUNK_TOKENS, map_workers: int = DEFAULT_MAP_WORKERS,
+                 interest_matcher: Optional[InterestMatcher] = None, cpu_pool: Optional[Executor] = None,
+                 metrics: Optional[Metrics] = None, item_store: Optional[ItemStore] = None):
+        """
+        Args:
+            llm_cache: Cache of parsed Gemini analyses keyed by prompt, model and sample
+            rate_limiter: Limiter shared by all Gemini requests of this analyzer
+            client: Gemini client to use (one genai.Client is created on first use if omitted)
+            sample_tokens: Approximate token budget of the posts sampled for the LLM
+            map_reduce: Analyze the whole history in chunks instead of a sample
+            chunk_tokens: Approximate token budget of one map-reduce chunk
+            map_workers: Chunks analyzed at the same time in map-reduce mode
+            interest_matcher: Subreddit to interest matcher (loaded from the taxonomy if omitted)
+            cpu_pool: Process pool running the heuristics and citation ranking (see create_cpu_pool)
+            metrics: Run metrics that stage times, LLM calls and token counts are recorded in
+            item_store: Item store whose incrementally kept activity histograms are used
+        """
+        super().__init__(interest_matcher)
+        self.cpu_pool = cpu_pool
+        self.metrics = metrics or Metrics()
+        self.item_store = item_store
+        self.llm_cache = llm_cache
+        self.sample_tokens = sample_tokens
+        self.map_reduce = map_reduce
+        self.chunk_tokens = chunk_tokens
+        self.map_workers = map_workers
+        self.rate_limiter = rate_limiter
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.gemini_api_key = os.getenv('GEMINI_API_KEY')
+        if not self.gemini_api_key:
+            print("Warning: Gemini API key not found. Using basic analysis only.")
+    
+    #Analyze user's posts to create a persona
+    #(in strict mode, AnalysisFailed is raised instead of building it without the LLM analysis)
+    def analyze_user(self, username: str, posts: List[RedditPost],
+                     llm_analysis: Optional[Dict[str, any]] = None, strict: bool = False) -> UserPersona:
+        if not posts:
+            return self._create_empty_persona(username)
+            
+        use_llm = bool(self.gemini_api_key)
+        if self.cpu_pool is not None:
+            # Heuristics run in a worker process while the LLM request is in flight
+            columns = posts if isinstance(posts, PostColumns) else PostColumns.from_posts(posts)
+            heuristics = self.cpu_pool.submit(_heuristics_task, columns, not use_llm)
+        else:
+            # Basic analysis (all heuristics share one pass over the posts)
+            with self.metrics.timer('stage_seconds', stage='heuristics'):
+                profile = self.heuristic_profile(posts, basic=not use_llm)
+        
+        # Advanced analysis using LLM if available
+        if use_llm and llm_analysis is None:
+            llm_analysis = self._llm_analyze_personality(posts)
+        if use_llm and not llm_analysis and strict:
+            if self.cpu_pool is not None:
+                heuristics.cancel()
+            raise AnalysisFailed(f"No LLM analysis for u/{username}")
+        
+        if self.cpu_pool is not None:
+            # Only the time spent waiting on the worker holds this user up
+            with self.metrics.timer('stage_seconds', stage='heuristics'):
+                profile = heuristics.result()
+        activity_patterns, interests, basic = profile
+        temporal = self._analyze_temporal(username, posts)
+        if temporal:
+            activity_patterns['temporal'] = temporal
+        if use_llm:
+            personality_traits = llm_analysis.get('personality_traits', [])
+            communication_style = llm_analysis.get('communication_style', '')
+            psychological_profile = llm_analysis.get('psychological_profile', {})
+        else:
+            personality_traits, communication_style, psychological_profile = basic
+        
+        # Generate citations
+        with self.metrics.timer('stage_seconds', stage='citations'):
+            if self.cpu_pool is not None:
+                citations = self.cpu_pool.submit(_citations_task, columns, personality_traits, interests).result()
+            else:
+                citations = self._generate_citations(posts, personality_traits, interests)
+        self.metrics.inc('users_analyzed_total')
+        
+        return UserPersona(
+            username=username,
+            personality_traits=personality_traits,
+            interests=interests,
+            communication_style=communication_style,
+            activity_patterns=activity_patterns,
+            psychological_profile=psychological_profile,
+            citations=citations
+        )
+    
+    def _analyze_temporal(self, username: str, posts: List[RedditPost]) -> Dict[str, any]:
+        """Summarize when the user is active, from the stored histogram if one is kept"""
+        histogram = self.item_store.load_activity(username) if self.item_store else None
+        if histogram is None:
+            histogram = ActivityHistogram.from_posts(posts)
+        return histogram.summary()
+    
+    #Analyze several users, packing their LLM samples into shared Gemini requests
+    #(in strict mode, users whose LLM analysis failed are left out of the result)
+    def analyze_users(self, users: Dict[str, List[RedditPost]],
+                      token_budget: int = DEFAULT_LLM_BATCH_TOKENS, strict: bool = False) -> Dict[str, UserPersona]:
+        # Map-reduce histories are too large to share a prompt; those users are analyzed one by one
+        llm_results = None
+        if self.gemini_api_key and not self.map_reduce:
+            samples = {username: self._build_sample(posts) for username, posts in users.items() if posts}
+            llm_results = self._llm_analyze_batch(samples, token_budget)
+        
+        # Users the batch could not analyze get an empty analysis rather than another request
+        personas = {}
+        for username, posts in users.items():
+            llm_analysis = llm_results.get(username, {}) if llm_results is not None else None
+            try:
+                personas[username] = self.analyze_user(username, posts, llm_analysis=llm_analysis, strict=strict)
+            except AnalysisFailed as e:
+                print(f"Error analyzing u/{username}: {e}")
+        return personas
+    
     def _llm_analyze_personality(self, posts: List[RedditPost]) -> Dict[str, any]:
         """Use LLM to analyze personality (requires Gemini API key)"""
         if not self.gemini_api_key or not posts:
             return {}
         
-        # Prepare sample content for analysis
-        sample_content = []
-        for post in posts[:20]:  # Limit to avoid token limits
-            sample_content.append(f"[{post.post_type}] {post.content[:200]}...")
-        
-        content_text = "\n".join(sample_content)
+        if self.map_reduce:
+            return self._llm_map_reduce(posts)
+        return self._analyze_sample(self._build_sample(posts))
+    
+    def _analyze_sample(self, content_text: str, template: str = PERSONA_PROMPT_TEMPLATE) -> Dict[str, any]:
+        """Analyze one user's prepared sample with a single Gemini request"""
+        # Identical samples produce identical prompts, so reuse earlier analyses
+        cache_key = None
+        if self.llm_cache:
+            cache_key = LLMCache.make_key(GEMINI_MODEL, template, content_text)
+            cached = self.llm_cache.get(cache_key)
+            if cached is not None:
+                self.metrics.inc('llm_cache_hits_total')
+                return cached
         
-        prompt = f"""
-        Analyze the following Reddit posts and comments to create a psychological profile:
-
-        {content_text}
-
-        Please provide your analysis in the following JSON format:
-        {{
-            "personality_traits": ["trait1", "trait2", "trait3", "trait4", "trait5"],
-            "communication_style": "brief description of communication style",
-            "psychological_profile": {{
-                "Social Orientation": "description",
-                "Emotional Pattern": "description",
-                "Thinking Style": "description",
-                "Behavior Pattern": "description"
-            }}
-        }}
-
-        Focus on:
-        1. Personality traits (5-7 specific traits based on posting patterns)
-        2. Communication style (how they express themselves)
-        3. Psychological characteristics (social, emotional, cognitive patterns)
+        prompt = template.format(content_text=content_text)
+        result = self._generate(prompt)
+        if not result:
+            return {}
 
-        Respond with ONLY the JSON object, no additional text.
-        """
-        
+        # Try to parse JSON
         try:
-            from google import genai
+            parsed_result = json.loads(result)
             
-            client = genai.Client()
+            # Validate the structure
+            if not isinstance(parsed_result, dict):
+                raise ValueError("Response is not a dictionary")
             
-            response = client.models.generate_content(
-                model="gemini-2.5-flash", contents=prompt
-            )
+            parsed_result = self._complete_analysis(parsed_result)
+            if self.llm_cache:
+                self.llm_cache.put(cache_key, parsed_result)
+            return parsed_result
             
-            # Check if response and content exist
-            if not response or not response.text:
-                print("Error: Empty response from Gemini API")
+        except (json.JSONDecodeError, ValueError) as json_error:
+            print(f"Error parsing JSON from Gemini response: {json_error}")
+            print(f"Raw response: {result}")
+            # Return fallback structure
+            return copy.deepcopy(LLM_PARSE_FAILED)
+    
+    def _llm_map_reduce(self, posts: List[RedditPost]) -> Dict[str, any]:
+        """
+        Analyze a user's whole history in token-bounded chunks and merge the partial profiles
+        
+        Chunks are cut from the oldest item onwards, so new activity only changes the last
+        chunks and every earlier chunk analysis is served from the LLM cache. This needs the
+        whole history (an item store): a crawl alone returns only the newest items, so old
+        items drop off the front and every chunk boundary moves.
+        """
+        chunks = self._chunk_history(posts)
+        if len(chunks) == 1:
+            return self._analyze_sample(chunks[0])
+        
+        # Map: analyze chunks concurrently (the shared rate limiter still applies)
+        with ThreadPoolExecutor(max_workers=self.map_workers) as executor:
+            partials = list(executor.map(self._analyze_sample, chunks))
+        partials = [partial for partial in partials if partial and partial != LLM_PARSE_FAILED]
+        if not partials:
+            return {}
+        
+        # Reduce: merge partial profiles, REDUCE_FANOUT at a time, until one is left
+        while len(partials) > 1:
+            groups = [partials[i:i + REDUCE_FANOUT] for i in range(0, len(partials), REDUCE_FANOUT)]
+            with ThreadPoolExecutor(max_workers=self.map_workers) as executor:
+                merged = list(executor.map(self._reduce_partials, groups))
+            partials = [partial for partial in merged if partial]
+            if not partials:
                 return {}
+        return partials[0]
+    
+    def _reduce_partials(self, partials: List[Dict[str, any]]) -> Dict[str, any]:
+        """Merge several partial profiles into one with a Gemini request"""
+        if len(partials) == 1:
+            return partials[0]
+        merged = self._analyze_sample(json.dumps(partials, indent=1), template=REDUCE_PROMPT_TEMPLATE)
+        if merged and merged != LLM_PARSE_FAILED:
+            return merged
+        
+        # Fall back to the most frequent traits and the first available descriptions
+        trait_counts = {}
+        for partial in partials:
+            for trait in partial.get('personality_traits', []):
+                trait_counts[trait] = trait_counts.get(trait, 0) + 1
+        return {
+            'personality_traits': sorted(trait_counts, key=trait_counts.get, reverse=True)[:7],
+            'communication_style': partials[0].get('communication_style', ''),
+            'psychological_profile': partials[0].get('psychological_profile', {})
+        }
+    
+    def _chunk_history(self, posts: List[RedditPost]) -> List[str]:
+        """Split a user's history, oldest first, into sample texts of at most chunk_tokens"""
+        chunks = []
+        lines = []
+        tokens = 0
+        # Items of unknown time go last, where they cannot shift the boundaries of earlier chunks
+        for post in sorted(posts, key=lambda post: (not post.created_utc, post.created_utc, item_key(post))):
+            line = _sample_line(post)
+            line_tokens = _estimate_tokens(line)
+            if lines and tokens + line_tokens > self.chunk_tokens:
+                chunks.append("\n".join(lines))
+                lines = []
+                tokens = 0
+            lines.append(line)
+            tokens += line_tokens
+        if lines:
+            chunks.append("\n".join(lines))
+        return chunks
+    
+    def _llm_analyze_batch(self, samples: Dict[str, str],
+                           token_budget: int = DEFAULT_LLM_BATCH_TOKENS) -> Dict[str, Dict[str, any]]:
+        """
+        Analyze several users with as few Gemini requests as possible
+        
+        Args:
+            samples: Mapping of username to prepared sample text
+            token_budget: Approximate input token cap of one packed prompt
             
-            result = response.text.strip()
-            
-            # Check if result is not None or empty
-            if not result:
-                print("Error: Empty content from Gemini API")
-                return {}
-            # Clean up the response - remove any markdown formatting
-            if result.startswith('```json'):
-                result = result[7:]  # Remove ```json
-            if result.endswith('```'):
-                result = result[:-3]  # Remove ```
-            result = result.strip()
-
-            # Try to parse JSON
-            try:
-                parsed_result = json.loads(result)
-                
-                # Validate the structure
-                if not isinstance(parsed_result, dict):
-                    raise ValueError("Response is not a dictionary")
-                
-                # Ensure required keys exist
-                if 'personality_traits' not in parsed_result:
-                    parsed_result['personality_traits'] = ['Unable to determine from AI response']
-                if 'communication_style' not in parsed_result:
-                    parsed_result['communication_style'] = 'Unable to determine from AI response'
-                if 'psychological_profile' not in parsed_result:
-                    parsed_result['psychological_profile'] = {'Status': 'Unable to determine from AI response'}
-                
-                return parsed_result
+        Returns:
+            Mapping of username to analysis for every user that could be analyzed
+        """
+        results = {}
+        pending = {}
+        
+        # Users whose sample is unchanged are served from the cache (same key as single-user analysis)
+        for username, content_text in samples.items():
+            cached = None
+            if self.llm_cache:
+                cached = self.llm_cache.get(LLMCache.make_key(GEMINI_MODEL, PERSONA_PROMPT_TEMPLATE, content_text))
+            if cached is not None:
+                self.metrics.inc('llm_cache_hits_total')
+                results[username] = cached
+            else:
+                pending[username] = content_text
+        
+        # Pack users into prompts that stay under the token budget
+        groups = []
+        group = {}
+        group_tokens = _estimate_tokens(BATCH_PROMPT_TEMPLATE)
+        for username, content_text in pending.items():
+            tokens = _estimate_tokens(content_text) + _estimate_tokens(username) + 8
+            if group and group_tokens + tokens > token_budget:
+                groups.append(group)
+                group = {}
+                group_tokens = _estimate_tokens(BATCH_PROMPT_TEMPLATE)
+            group[username] = content_text
+            group_tokens += tokens
+        if group:
+            groups.append(group)
+        
+        for group in groups:
+            results.update(self._llm_analyze_group(group))
+        return results
+    
+    def _llm_analyze_group(self, group: Dict[str, str]) -> Dict[str, Dict[str, any]]:
+        """
+        Analyze one packed group, splitting it in halves when the response cannot be parsed
+        
+        Users of a failed request are left out of the result without further requests.
+        """
+        if len(group) == 1:
+            username, content_text = next(iter(group.items()))
+            return {username: self._analyze_sample(content_text)}
+        
+        sections = "\n\n".join(f"=== USER {username} ===\n{content_text}"
+                                for username, content_text in group.items())
+        prompt = BATCH_PROMPT_TEMPLATE.format(sections=sections)
+        result = self._generate(prompt)
+        if not result:
+            # The request itself failed (error or exhausted quota); splitting would only send more
+            return {}
+        
+        analyses = {}
+        try:
+            parsed_result = json.loads(result)
+            if not isinstance(parsed_result, dict):
+                raise ValueError("Response is not a dictionary keyed by username")
+            for username, content_text in group.items():
+                analysis = parsed_result.get(username)
+                if isinstance(analysis, dict):
+                    analyses[username] = self._complete_analysis(analysis)
+                    if self.llm_cache:
+                        self.llm_cache.put(LLMCache.make_key(GEMINI_MODEL, PERSONA_PROMPT_TEMPLATE, content_text),
+                                           analyses[username])
+            if not analyses:
+                raise ValueError("Response has no analysis for any user of the group")
+        except (json.JSONDecodeError, ValueError) as json_error:
+            print(f"Error parsing batched Gemini response for {len(group)} users: {json_error}")
+            names = list(group)
+            half = len(names) // 2
+            analyses.update(self._llm_analyze_group({name: group[name] for name in names[:half]}))
+            analyses.update(self._llm_analyze_group({name: group[name] for name in names[half:]}))
+            return analyses
+        
+        # Retry users the model left out of an otherwise valid response
+        missing = {username: content_text for username, content_text in group.items() if username not in analyses}
+        if missing:
+            analyses.update(self._llm_analyze_group(missing))
+        return analyses
+    
+    def _build_sample(self, posts: List[RedditPost]) -> str:
+        """Prepare the sample of a user's posts that is sent to the LLM"""
+        sample_content = []
+        with self.metrics.timer('stage_seconds', stage='sample'):
+            for post in select_sample(posts, self.sample_tokens):
+                sample_content.append(_sample_line(post))
+        
+        return "\n".join(sample_content)
+    
+    def _get_client(self):
+        """Return the shared Gemini client, creating it on first use"""
+        with self._client_lock:
+            if self._client is None:
+                from google import genai
                 
-            except (json.JSONDecodeError, ValueError) as json_error:
-                print(f"Error parsing JSON from Gemini response: {json_error}")
-                print(f"Raw response: {result}")
-                # Return fallback structure
-                return {
-                    'personality_traits': ['Unable to parse AI response'],
-                    'communication_style': 'Unable to parse AI response',
-                    'psychological_profile': {'Status': 'AI parsing failed'}
-                }
-            
+                self._client = genai.Client()
+        return self._client
+    
+    def _generate(self, prompt: str) -> Optional[str]:
+        """Send a prompt to Gemini and return the response text without markdown fences"""
+        try:
+            client = self._get_client()
         except ImportError:
             print("Error: google-genai library not installed. Run: pip install google-genai")
-            return {}
-        except Exception as e:
-            print(f"Error in LLM analysis: {e}")
-            return {}
-    
-    def _generate_citations(self, posts: List[RedditPost], traits: List[str], interests: List[str]) -> Dict[str, List[str]]:
-        """Generate citations for personality traits and interests"""
-        citations = {}
+            return None
         
-        # Cite posts for interests
-        for interest in interests:
-            citations[f"Interest: {interest}"] = []
-            for post in posts:
-                if interest.lower() in post.subreddit.lower() or interest.lower() in post.content.lower():
-                    citation = f"[{post.post_type}] in r/{post.subreddit}: \"{post.content[:100]}...\""
-                    citations[f"Interest: {interest}"].append(citation)
-                    if len(citations[f"Interest: {interest}"]) >= 3:  # Limit citations
-                        break
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                with self.metrics.timer('stage_seconds', stage='llm'):
+                    response = client.models.generate_content(
+                        model=GEMINI_MODEL, contents=prompt
+                    )
+            except Exception as e:
+                if not _is_rate_limited(e) or attempt == LLM_MAX_RETRIES:
+                    self.metrics.inc('llm_requests_total', outcome='error')
+                    print(f"Error in LLM analysis: {e}")
+                    return None
+                self.metrics.inc('llm_requests_total', outcome='throttled')
+                
+                # Quota exhausted: slow the shared limiter down and back off with jitter
+                if self.rate_limiter:
+                    self.rate_limiter.on_throttle()
+                delay = min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                continue
+            
+            if self.rate_limiter:
+                self.rate_limiter.on_success()
+            self.metrics.inc('llm_requests_total', outcome='ok')
+            usage = getattr(response, 'usage_metadata', None)
+            if usage:
+                self.metrics.inc('llm_tokens_total', getattr(usage, 'prompt_token_count', None) or 0, kind='prompt')
+                self.metrics.inc('llm_tokens_total', getattr(usage, 'candidates_token_count', None) or 0, kind='output')
+            break
         
-        # Cite posts for traits (simplified)
-        for trait in traits:
-            citations[f"Trait: {trait}"] = []
-            # Add sample posts as evidence
-            for post in posts[:3]:  # Use first few posts as general evidence
-                citation = f"[{post.post_type}] in r/{post.subreddit}: \"{post.content[:100]}...\""
-                citations[f"Trait: {trait}"].append(citation)
+        # Check if response and content exist
+        if not response or not response.text:
+            print("Error: Empty response from Gemini API")
+            return None
         
-        return citations
+        result = response.text.strip()
+        
+        # Check if result is not None or empty
+        if not result:
+            print("Error: Empty content from Gemini API")
+            return None
+        # Clean up the response - remove any markdown formatting
+        if result.startswith('```json'):
+            result = result[7:]  # Remove ```json
+        if result.endswith('```'):
+            result = result[:-3]  # Remove ```
+        return result.strip()
+    
+    def _complete_analysis(self, parsed_result: Dict[str, any]) -> Dict[str, any]:
+        """Ensure required keys exist in a parsed analysis"""
+        if 'personality_traits' not in parsed_result:
+            parsed_result['personality_traits'] = ['Unable to determine from AI response']
+        if 'communication_style' not in parsed_result:
+            parsed_result['communication_style'] = 'Unable to determine from AI response'
+        if 'psychological_profile' not in parsed_result:
+            parsed_result['psychological_profile'] = {'Status': 'Unable to determine from AI response'}
+        return parsed_result
     
     def _create_empty_persona(self, username: str) -> UserPersona:
         """Create empty persona when no data is available"""
@@ -604,90 +2871,399 @@ class PersonaAnalyzer:
             citations={}
         )
 
+# Per-process state of CPU pool workers
+_worker_heuristics: Optional[HeuristicAnalyzer] = None
+
+def create_cpu_pool(processes: int, interest_matcher: InterestMatcher) -> ProcessPoolExecutor:
+    """
+    Create the process pool that page parsing, heuristics and citation ranking run in
+    
+    Work units are single listing pages and single users, shipped as PostColumns.
+    Workers are spawned (not forked) since the pool is used next to HTTP threads.
+    """
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_cpu_worker, initargs=(interest_matcher,))
+
+def _init_cpu_worker(interest_matcher: InterestMatcher):
+    global _worker_heuristics
+    _worker_heuristics = HeuristicAnalyzer(interest_matcher)
+
+@lru_cache(maxsize=2)
+def _page_parser(fast_html: bool) -> RedditScraper:
+    """Scraper whose parse methods are used inside a worker process (it never creates a transport)"""
+    return RedditScraper(fast_html=fast_html)
+
+def _parse_page_task(parser_name: str, content: bytes, url: str,
+                     fast_html: bool) -> Tuple[PostColumns, Optional[str]]:
+    """Parse one listing page (HTML or JSON) in a worker process"""
+    parser = _page_parser(fast_html)
+    if parser_name == '_parse_json_page':
+        items, next_url = parser._parse_json_page(content, url)
+    else:
+        items, next_url = parser._parse_html_page(content, getattr(parser, parser_name))
+    return PostColumns.from_posts(items), next_url
+
+def _heuristics_task(columns: PostColumns, basic: bool):
+    """Compute a user's heuristic profile in a worker process"""
+    return _worker_heuristics.heuristic_profile(columns, basic)
+
+def _citations_task(columns: PostColumns, traits: List[str], interests: List[str]) -> Dict[str, List[str]]:
+    """Rank a user's citations in a worker process"""
+    return _worker_heuristics._generate_citations(columns, traits, interests)
+
+@dataclass
+class CohortFeatures:
+    """Per-user feature matrix of a cohort (one row per user, one column per feature)"""
+    usernames: List[str]
+    names: List[str]
+    matrix: any
+    top_subreddits: List[Tuple[str, int]]
+    profiles: Dict[str, any]  # Heuristic psychological profile label of every user, per profile key
+    
+    def percentiles(self, percentiles: Tuple[int, ...] = COHORT_PERCENTILES) -> Dict[str, Dict[int, float]]:
+        """Cohort percentiles of every feature"""
+        if not self.usernames:
+            return {}
+        values = np.percentile(self.matrix, percentiles, axis=0)
+        return {name: {p: float(values[i, column]) for i, p in enumerate(percentiles)}
+                for column, name in enumerate(self.names)}
+    
+    def save_csv(self, path: str):
+        """Write one row per user with its features, top subreddit and profile labels"""
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['username'] + self.names + ['top_subreddit', 'top_subreddit_count'] + list(self.profiles))
+            for row, username in enumerate(self.usernames):
+                writer.writerow([username] + [f"{value:g}" for value in self.matrix[row]]
+                                + list(self.top_subreddits[row])
+                                + [labels[row] for labels in self.profiles.values()])
+        print(f"Cohort features saved to: {path}")
+
+class CohortAnalyzer:
+    """
+    Computes the heuristic persona features of a whole cohort with vectorized group-bys
+    
+    Produces the same numbers as PersonaAnalyzer's activity patterns and basic
+    psychological profile, but as one pass of bincounts over a CohortTable instead of
+    one Python loop per user. Requires numpy.
+    """
+    
+    FEATURES = ['total_items', 'total_posts', 'total_comments', 'total_score', 'average_score',
+                'average_length', 'subreddit_diversity', 'diversity_ratio', 'comment_ratio',
+                'questions_per_item', 'exclamations_per_item', 'caps_ratio']
+    
+    def __init__(self):
+        if np is None:
+            raise ImportError("numpy is required for cohort analytics. Run: pip install numpy")
+    
+    def features(self, table: CohortTable) -> CohortFeatures:
+        """Compute every user's features in one pass over the table"""
+        columns = table.to_numpy()
+        users = columns['user_codes']
+        user_count = len(table.usernames)
+        
+        def per_user(weights=None):
+            return np.bincount(users, weights=weights, minlength=user_count)
+        
+        total = per_user().astype(np.float64)
+        posts = per_user(columns['types'] == 0)
+        total_score = per_user(columns['scores'])
+        safe_total = np.maximum(total, 1)
+        
+        # Group by (user, subreddit): distinct pairs give diversity, the largest group the top subreddit
+        subreddit_count = max(len(table.subreddits), 1)
+        pairs = users.astype(np.int64) * subreddit_count + columns['subreddit_codes']
+        pair_keys, first_seen, pair_counts = np.unique(pairs, return_index=True, return_counts=True)
+        pair_users = pair_keys // subreddit_count
+        diversity = np.bincount(pair_users, minlength=user_count).astype(np.float64)
+        
+        # Most items first, ties broken by first appearance (as PostStatistics.top_subreddits does)
+        order = np.lexsort((first_seen, -pair_counts, pair_users))
+        leaders = order[np.r_[True, pair_users[order][1:] != pair_users[order][:-1]]] if len(order) else order
+        top_subreddits = [('', 0)] * user_count
+        for user, key, count in zip(pair_users[leaders], pair_keys[leaders], pair_counts[leaders]):
+            top_subreddits[user] = (table.subreddits[key % subreddit_count], int(count))
+        
+        average_score = total_score / safe_total
+        matrix = np.column_stack([
+            total,
+            posts,
+            total - posts,
+            total_score,
+            average_score,
+            per_user(columns['lengths']) / safe_total,
+            diversity,
+            diversity / safe_total,
+            (total - posts) / safe_total,
+            per_user(columns['questions']) / safe_total,
+            per_user(columns['exclamations']) / safe_total,
+            per_user(columns['all_caps']) / safe_total
+        ])
+        
+        # Same thresholds as PersonaAnalyzer._basic_psychological_profile
+        profiles = {
+            'Activity Level': np.select([total > 100, total > 20],
+                                        ['Highly active', 'Moderately active'], 'Casual user'),
+            'Social Validation': np.select([average_score > 100, average_score > 10],
+                                           ['High engagement seeker', 'Moderate engagement seeker'],
+                                           'Low engagement seeker'),
+            'Interest Breadth': np.select([diversity > 20, diversity > 5],
+                                          ['Very diverse interests', 'Diverse interests'], 'Focused interests')
+        }
+        return CohortFeatures(usernames=list(table.usernames), names=list(self.FEATURES), matrix=matrix,
+                              top_subreddits=top_subreddits, profiles=profiles)
+
+class JsonlPersonaWriter:
+    """Appends one JSON persona record per line to a shared file"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+    
+    def write(self, record: Dict[str, any], on_saved: Optional[Callable[[str, str], None]] = None) -> str:
+        """Append a record and flush it to disk, then call on_saved(username, path)"""
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+        if on_saved:
+            on_saved(record['username'], self.path)
+        return self.path
+    
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class ParquetPersonaWriter:
+    """
+    Writes persona records to a directory of Parquet part files, one per row group (requires pyarrow)
+    
+    A part file only appears once it is complete, so the output stays readable when a run is
+    killed, and later runs add parts next to the earlier ones instead of rewriting them.
+    Read the whole output with pyarrow.parquet.read_table(path).
+    """
+    
+    # Nested fields are stored as JSON strings so the schema stays fixed
+    JSON_FIELDS = ('activity_patterns', 'psychological_profile', 'citations')
+    
+    def __init__(self, path: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is required for Parquet output. Run: pip install pyarrow")
+        
+        self.path = path
+        self.row_group_size = row_group_size
+        self._pa = pa
+        self._pq = pq
+        self._schema = pa.schema([
+            ('username', pa.string()),
+            ('personality_traits', pa.list_(pa.string())),
+            ('interests', pa.list_(pa.string())),
+            ('communication_style', pa.string()),
+            ('activity_patterns', pa.string()),
+            ('psychological_profile', pa.string()),
+            ('citations', pa.string()),
+            ('generated_at', pa.string())
+        ])
+        os.makedirs(path, exist_ok=True)
+        # Unique per writer, so parts of earlier runs are never overwritten
+        self._run = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self._parts = 0
+        self._rows = []
+        self._callbacks = []
+        self._lock = threading.Lock()
+    
+    def write(self, record: Dict[str, any], on_saved: Optional[Callable[[str, str], None]] = None) -> str:
+        """
+        Buffer a record, writing a part file once enough have accumulated
+        
+        on_saved(username, part file) is called once the record's part file is written.
+        """
+        row = dict(record)
+        for key in self.JSON_FIELDS:
+            row[key] = json.dumps(row[key], ensure_ascii=False)
+        with self._lock:
+            self._rows.append(row)
+            self._callbacks.append(on_saved)
+            if len(self._rows) >= self.row_group_size:
+                self._flush()
+        return self.path
+    
+    def _flush(self):
+        if not self._rows:
+            return
+        part = os.path.join(self.path, f"part-{self._run}-{self._parts:05d}.parquet")
+        # Written under a hidden name (ignored by readers) and renamed once complete
+        staging = os.path.join(self.path, f".{os.path.basename(part)}.tmp")
+        self._pq.write_table(self._pa.Table.from_pylist(self._rows, schema=self._schema), staging)
+        os.replace(staging, part)
+        self._parts += 1
+        for row, on_saved in zip(self._rows, self._callbacks):
+            if on_saved:
+                on_saved(row['username'], part)
+        self._rows = []
+        self._callbacks = []
+    
+    def close(self):
+        with self._lock:
+            self._flush()
+
 class PersonaReporter:
     """Generates reports from user personas"""
     
+    def __init__(self, output_format: str = 'text', output_path: Optional[str] = None,
+                 row_group_size: int = DEFAULT_ROW_GROUP_SIZE, metrics: Optional[Metrics] = None):
+        """
+        Args:
+            output_format: 'text' (one report file per user), 'jsonl' (one shared file) or 'parquet'
+                (one shared directory of part files)
+            output_path: Shared output file or directory for jsonl/parquet (timestamped name if omitted)
+            row_group_size: Personas buffered per Parquet row group
+            metrics: Run metrics that report write times are recorded in
+        """
+        self.output_format = output_format
+        self.metrics = metrics or Metrics()
+        self._writer = None
+        if output_format != 'text':
+            if not output_path:
+                output_path = f"personas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{output_format}"
+            if output_format == 'jsonl':
+                self._writer = JsonlPersonaWriter(output_path)
+            elif output_format == 'parquet':
+                self._writer = ParquetPersonaWriter(output_path, row_group_size)
+            else:
+                raise ValueError(f"Unknown output format: {output_format}")
+    
     def generate_report(self, persona: UserPersona) -> str:
         """Generate a comprehensive text report"""
-        report = []
-        report.append("=" * 80)
-        report.append(f"REDDIT USER PERSONA REPORT: u/{persona.username}")
-        report.append("=" * 80)
-        report.append("")
+        return "\n".join(self.iter_report_lines(persona))
+    
+    def iter_report_lines(self, persona: UserPersona) -> Iterator[str]:
+        """Yield the lines of the text report one at a time"""
+        yield "=" * 80
+        yield f"REDDIT USER PERSONA REPORT: u/{persona.username}"
+        yield "=" * 80
+        yield ""
         
         # Activity Overview
-        report.append("ACTIVITY OVERVIEW")
-        report.append("-" * 40)
+        yield "ACTIVITY OVERVIEW"
+        yield "-" * 40
         if persona.activity_patterns:
-            report.append(f"Total Posts: {persona.activity_patterns.get('total_posts', 0)}")
-            report.append(f"Total Comments: {persona.activity_patterns.get('total_comments', 0)}")
-            report.append(f"Average Score: {persona.activity_patterns.get('average_score', 0):.1f}")
-            report.append(f"Subreddit Diversity: {persona.activity_patterns.get('subreddit_diversity', 0)}")
+            yield f"Total Posts: {persona.activity_patterns.get('total_posts', 0)}"
+            yield f"Total Comments: {persona.activity_patterns.get('total_comments', 0)}"
+            yield f"Average Score: {persona.activity_patterns.get('average_score', 0):.1f}"
+            yield f"Subreddit Diversity: {persona.activity_patterns.get('subreddit_diversity', 0)}"
             
             if persona.activity_patterns.get('top_subreddits'):
-                report.append("\nTop Subreddits:")
+                yield "\nTop Subreddits:"
                 for subreddit, count in persona.activity_patterns['top_subreddits'][:5]:
-                    report.append(f"  • r/{subreddit}: {count} posts")
+                    yield f"  • r/{subreddit}: {count} posts"
         else:
-            report.append("No activity data available")
+            yield "No activity data available"
+        
+        yield ""
         
-        report.append("")
+        # Activity Timing
+        temporal = persona.activity_patterns.get('temporal') if persona.activity_patterns else None
+        if temporal:
+            yield "ACTIVITY TIMING"
+            yield "-" * 40
+            yield f"Busiest Weekday: {temporal['peak_weekday']}"
+            yield f"Busiest Hour: {temporal['peak_hour_utc']:02d}:00 UTC (busiest hour of the week: {temporal['peak_time']})"
+            yield f"Active Days: {temporal['active_days']} in the last {ACTIVITY_DAYS} days of activity, {temporal['items_per_active_day']:.1f} items per active day"
+            yield f"Average Gap: {temporal['average_gap_days']:.1f} days between items ({temporal['first_seen']} to {temporal['last_seen']})"
+            yield f"Burst Days: {temporal['burst_days']} (busiest day: {temporal['max_items_per_day']} items)"
+            yield f"Longest Streak: {temporal['longest_streak_days']} days"
+            yield ""
         
         # Personality Traits
-        report.append("PERSONALITY TRAITS")
-        report.append("-" * 40)
+        yield "PERSONALITY TRAITS"
+        yield "-" * 40
         for trait in persona.personality_traits:
-            report.append(f"• {trait}")
-        report.append("")
+            yield f"• {trait}"
+        yield ""
         
         # Interests
-        report.append("INTERESTS")
-        report.append("-" * 40)
+        yield "INTERESTS"
+        yield "-" * 40
         for interest in persona.interests:
-            report.append(f"• {interest}")
-        report.append("")
+            yield f"• {interest}"
+        yield ""
         
         # Communication Style
-        report.append("COMMUNICATION STYLE")
-        report.append("-" * 40)
-        report.append(persona.communication_style)
-        report.append("")
+        yield "COMMUNICATION STYLE"
+        yield "-" * 40
+        yield persona.communication_style
+        yield ""
         
         # Psychological Profile
-        report.append("PSYCHOLOGICAL PROFILE")
-        report.append("-" * 40)
+        yield "PSYCHOLOGICAL PROFILE"
+        yield "-" * 40
         for key, value in persona.psychological_profile.items():
-            report.append(f"{key}: {value}")
-        report.append("")
+            yield f"{key}: {value}"
+        yield ""
         
         # Citations
-        report.append("CITATIONS & EVIDENCE")
-        report.append("-" * 40)
+        yield "CITATIONS & EVIDENCE"
+        yield "-" * 40
         for category, citations in persona.citations.items():
             if citations:
-                report.append(f"\n{category}:")
+                yield f"\n{category}:"
                 for citation in citations[:3]:  # Limit to 3 citations per category
-                    report.append(f"  • {citation}")
+                    yield f"  • {citation}"
         
-        report.append("")
-        report.append("=" * 80)
-        report.append(f"Report generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        report.append("=" * 80)
+        yield ""
+        yield "=" * 80
+        yield f"Report generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        yield "=" * 80
+    
+    def persona_record(self, persona: UserPersona) -> Dict[str, any]:
+        """Render a persona as a flat record for JSONL/Parquet output"""
+        record = asdict(persona)
+        record['generated_at'] = datetime.now().isoformat(timespec='seconds')
+        return record
+    
+    def save_report(self, persona: UserPersona, filename: Optional[str] = None,
+                    on_saved: Optional[Callable[[str, str], None]] = None):
+        """
+        Save report to file (or append it to the shared jsonl/parquet output)
         
-        return "\n".join(report)
+        on_saved(username, file) is called once the report is on disk; for Parquet that is
+        when its row group is written, which may be after this returns.
+        """
+        with self.metrics.timer('stage_seconds', stage='report'):
+            filename = self._write_report(persona, filename, on_saved)
+        self.metrics.inc('reports_written_total', format=self.output_format)
+        return filename
     
-    def save_report(self, persona: UserPersona, filename: Optional[str] = None):
-        """Save report to file"""
+    def _write_report(self, persona: UserPersona, filename: Optional[str] = None,
+                      on_saved: Optional[Callable[[str, str], None]] = None) -> str:
+        if self._writer:
+            return self._writer.write(self.persona_record(persona), on_saved)
+        
         if not filename:
             filename = f"persona_{persona.username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
         
-        report = self.generate_report(persona)
-        
+        # Stream the report line by line instead of building it in memory
         with open(filename, 'w', encoding='utf-8') as f:
-            f.write(report)
+            for index, line in enumerate(self.iter_report_lines(persona)):
+                if index:
+                    f.write("\n")
+                f.write(line)
         
         print(f"Report saved to: {filename}")
+        if on_saved:
+            on_saved(persona.username, filename)
         return filename
+    
+    def close(self):
+        """Flush and close the shared output file, if any"""
+        if self._writer:
+            self._writer.close()
+            print(f"Personas saved to: {self._writer.path}")
 
 def extract_username_from_url(url: str) -> str:
     """Extract username from Reddit URL"""
@@ -707,13 +3283,349 @@ def extract_username_from_url(url: str) -> str:
     # If no pattern matches, assume it is already an username
     return url.strip('/')
 
+def read_user_list(path: str) -> List[str]:
+    """Read usernames or profile URLs (one per line) from a file"""
+    usernames = []
+    seen = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            username = extract_username_from_url(line)
+            if username not in seen:
+                seen.add(username)
+                usernames.append(username)
+    return usernames
+
+async def run_batch(usernames: List[str], scraper: RedditScraper, analyzer: PersonaAnalyzer,
+                    reporter: PersonaReporter, concurrency: int = DEFAULT_CONCURRENCY,
+                    llm_batch_size: int = 1,
+                    llm_batch_tokens: int = DEFAULT_LLM_BATCH_TOKENS,
+                    analysis_workers: int = DEFAULT_ANALYSIS_WORKERS,
+                    queue: Optional[BatchQueue] = None) -> Dict[str, Optional[str]]:
+    """
+    Scrape many users concurrently and analyze them as soon as their data arrives
+    
+    Scraping and analysis run as two overlapping stages with their own worker pools,
+    so a batch takes about as long as the slower stage.
+    
+    Args:
+        usernames: Reddit usernames to profile
+        scraper: Scraper shared by all workers (and so its connection pool)
+        analyzer: Persona analyzer
+        reporter: Report writer
+        concurrency: Number of users scraped at the same time
+        llm_batch_size: Number of scraped users whose LLM samples share one Gemini request
+        llm_batch_tokens: Approximate input token cap of one shared Gemini request
+        analysis_workers: Number of analysis groups processed at the same time
+        queue: Durable progress; finished stages of earlier runs are skipped and failed
+            scrapes are retried within the user's retry budget
+        
+    Returns:
+        Mapping of username to saved report filename (None if the user failed)
+    """
+    loop = asyncio.get_running_loop()
+    scrape_executor = ThreadPoolExecutor(max_workers=concurrency)
+    analysis_executor = ThreadPoolExecutor(max_workers=analysis_workers)
+    pending = asyncio.Queue()
+    scraped = asyncio.Queue()
+    groups = asyncio.Queue(maxsize=analysis_workers * 2)
+    results = {}
+    
+    # Resume from the last checkpoint of each user
+    progress = queue.enqueue(usernames) if queue else {}
+    to_scrape = []
+    for username in usernames:
+        state, _ = progress.get(username, ('pending', 0))
+        if state == 'reported':
+            results[username] = queue.report(username)
+        elif state == 'failed':
+            results[username] = None
+        elif state == 'analyzed':
+            persona = queue.load_persona(username)
+            # Checkpointed as reported only once the report is on disk
+            filename = reporter.save_report(persona, on_saved=queue.mark_reported)
+            results[username] = filename
+        else:
+            to_scrape.append(username)
+    if len(to_scrape) < len(usernames):
+        print(f"Resuming from earlier progress: {len(to_scrape)} of {len(usernames)} users left to scrape")
+    
+    for username in to_scrape:
+        pending.put_nowait(username)
+    
+    def load_user(username: str) -> List[RedditPost]:
+        # Users scraped by an earlier run only need their stored items
+        if queue and scraper.store and progress.get(username, ('pending', 0))[0] == 'scraped':
+            return scraper.store.load_columns(username)
+        posts = scraper.get_user_data(username)
+        if queue:
+            queue.mark_scraped(username)
+        return posts
+    
+    async def scrape_worker():
+        while True:
+            try:
+                username = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                posts = await loop.run_in_executor(scrape_executor, load_user, username)
+            except Exception as e:
+                print(f"Error scraping u/{username}: {e}")
+                if queue and queue.record_failure(username, e):
+                    # Transient failures (network blips, throttling) get another try after a pause
+                    await asyncio.sleep(BATCH_RETRY_DELAY * random.uniform(0.5, 1.5))
+                    pending.put_nowait(username)
+                    continue
+                posts = None
+            await scraped.put((username, posts))
+    
+    async def group_users():
+        buffered = {}
+        for _ in range(len(to_scrape)):
+            username, posts = await scraped.get()
+            if posts is None:
+                results[username] = None
+                continue
+            buffered[username] = posts
+            if len(buffered) >= llm_batch_size:
+                await groups.put(buffered)
+                buffered = {}
+        if buffered:
+            await groups.put(buffered)
+        for _ in range(analysis_workers):
+            await groups.put(None)
+    
+    def analyze_and_report(users: Dict[str, List[RedditPost]]) -> Dict[str, str]:
+        # Strict: a persona without its LLM analysis is not checkpointed as done
+        if len(users) == 1:
+            username, posts = next(iter(users.items()))
+            personas = {username: analyzer.analyze_user(username, posts, strict=True)}
+        else:
+            personas = analyzer.analyze_users(users, token_budget=llm_batch_tokens, strict=True)
+        if queue:
+            # Users left out stay scraped; the next run analyzes them again
+            for username in users.keys() - personas.keys():
+                queue.record_failure(username, AnalysisFailed(f"No LLM analysis for u/{username}"))
+        filenames = {}
+        for username, persona in personas.items():
+            if queue:
+                queue.mark_analyzed(username, persona)
+            filenames[username] = reporter.save_report(persona, on_saved=queue.mark_reported if queue else None)
+        return filenames
+    
+    async def analysis_worker():
+        while True:
+            users = await groups.get()
+            if users is None:
+                return
+            try:
+                filenames = await loop.run_in_executor(analysis_executor, analyze_and_report, users)
+                for username, posts in users.items():
+                    results[username] = filenames.get(username)
+                    if results[username]:
+                        print(f"[{len(results)}/{len(usernames)}] u/{username}: {len(posts)} posts/comments")
+            except Exception as e:
+                print(f"Error analyzing {', '.join(f'u/{username}' for username in users)}: {e}")
+                results.update(dict.fromkeys(users))
+                if queue:
+                    # Counted against the budget; the next run retries from the last checkpoint
+                    for username in users:
+                        queue.record_failure(username, e)
+    
+    tasks = [asyncio.create_task(scrape_worker()) for _ in range(min(concurrency, len(to_scrape)))]
+    tasks.append(asyncio.create_task(group_users()))
+    tasks.extend(asyncio.create_task(analysis_worker()) for _ in range(analysis_workers))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        scrape_executor.shutdown(wait=False)
+        analysis_executor.shutdown(wait=False)
+    
+    return results
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Reddit User Persona Generator")
+    parser.add_argument('user', nargs='?', help="Reddit user URL or username (prompted for if omitted)")
+    parser.add_argument('--max-pages', type=int, default=DEFAULT_MAX_PAGES,
+                        help="Maximum listing pages to fetch for posts and for comments")
+    parser.add_argument('--max-items', type=int, default=DEFAULT_MAX_ITEMS,
+                        help="Maximum items to collect for posts and for comments")
+    parser.add_argument('--max-age-days', type=int, default=None,
+                        help="Stop crawling once activity older than this many days is reached")
+    parser.add_argument('--backend', choices=['json', 'html'], default='json',
+                        help="Read Reddit's .json listings (default) or scrape the HTML pages")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help="Cache profile pages and Gemini analyses in DIR across runs")
+    parser.add_argument('--http-cache-mb', type=int, default=DEFAULT_HTTP_CACHE_BYTES // (1024 * 1024),
+                        help="Size cap of the on-disk page cache in megabytes")
+    parser.add_argument('--llm-cache-ttl-hours', type=float, default=DEFAULT_LLM_CACHE_TTL / 3600,
+                        help="How long cached Gemini analyses in --cache-dir are reused")
+    parser.add_argument('--taxonomy', metavar='FILE',
+                        help="JSON object mapping subreddit name fragments to interests")
+    parser.add_argument('--item-store', metavar='FILE',
+                        help="SQLite file accumulating each user's history; re-runs only fetch new activity")
+    parser.add_argument('--format', choices=['text', 'jsonl', 'parquet'], default='text',
+                        help="Report format: one text file per user, or all personas in one JSONL/Parquet file")
+    parser.add_argument('--output', metavar='PATH',
+                        help="Output file for jsonl, or directory of part files for parquet (timestamped name if omitted)")
+    parser.add_argument('--metrics-file', metavar='FILE',
+                        help="Write per-stage latency histograms and counters to FILE (.json for JSON, else Prometheus text)")
+    parser.add_argument('--cohort', action='store_true',
+                        help="Compute features and percentiles for the users in --item-store (limited to --batch if given) "
+                             "and write them as CSV to --output")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="Profile every username or URL listed in FILE (one per line)")
+    parser.add_argument('--progress', metavar='FILE',
+                        help="SQLite file recording batch progress for resuming (default: <batch file>.progress.sqlite)")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore the progress of earlier runs of this batch")
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="Failed attempts after which a user is skipped in batch mode")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="Users scraped at the same time in batch mode")
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST,
+                        help="Maximum in-flight requests per host in batch mode")
+    parser.add_argument('--host-rps', type=float, default=DEFAULT_HOST_RPS,
+                        help="Maximum sustained requests per second to each Reddit host")
+    parser.add_argument('--pool-size', type=int,
+                        help="Kept-alive HTTP connections per host (default: --per-host)")
+    parser.add_argument('--connect-timeout', type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                        help="Seconds to wait for an HTTP connection")
+    parser.add_argument('--read-timeout', type=float, default=DEFAULT_READ_TIMEOUT,
+                        help="Seconds to wait for data from the server")
+    parser.add_argument('--http1', action='store_true',
+                        help="Use HTTP/1.1 even if httpx and h2 are installed")
+    parser.add_argument('--analysis-workers', type=int, default=DEFAULT_ANALYSIS_WORKERS,
+                        help="Users (or LLM batches) analyzed at the same time in batch mode")
+    parser.add_argument('--processes', type=int, default=0,
+                        help="Worker processes for page parsing and heuristics in batch mode (0 = in-process)")
+    parser.add_argument('--llm-rpm', type=float, default=DEFAULT_LLM_RPM,
+                        help="Maximum Gemini requests per minute (lowered automatically on 429s)")
+    parser.add_argument('--sample-tokens', type=int, default=DEFAULT_SAMPLE_TOKENS,
+                        help="Approximate token budget of the posts sent to Gemini per user")
+    parser.add_argument('--map-reduce', action='store_true',
+                        help="Analyze each user's whole history in chunks and merge the results")
+    parser.add_argument('--chunk-tokens', type=int, default=DEFAULT_CHUNK_TOKENS,
+                        help="Approximate token budget of one map-reduce chunk")
+    parser.add_argument('--llm-batch-size', type=int, default=1,
+                        help="Users analyzed per Gemini request in batch mode")
+    parser.add_argument('--llm-batch-tokens', type=int, default=DEFAULT_LLM_BATCH_TOKENS,
+                        help="Approximate input token cap of a multi-user Gemini request")
+    return parser.parse_args(argv)
+
+def create_transport(args: argparse.Namespace, pool_size: int = DEFAULT_PER_HOST) -> HttpTransport:
+    """Create the HTTP transport from the --pool-size, timeout and --http1 options"""
+    return HttpTransport(pool_size=args.pool_size or pool_size, connect_timeout=args.connect_timeout,
+                         read_timeout=args.read_timeout, http2=not args.http1)
+
+def create_response_cache(args: argparse.Namespace) -> Optional[ResponseCache]:
+    """Open the on-disk response cache if --cache-dir was given"""
+    if not args.cache_dir:
+        return None
+    os.makedirs(args.cache_dir, exist_ok=True)
+    return ResponseCache(os.path.join(args.cache_dir, 'http_cache.sqlite'),
+                         max_bytes=args.http_cache_mb * 1024 * 1024)
+
+def create_llm_cache(args: argparse.Namespace) -> Optional[LLMCache]:
+    """Open the Gemini analysis cache if --cache-dir was given"""
+    if not args.cache_dir:
+        return None
+    os.makedirs(args.cache_dir, exist_ok=True)
+    return LLMCache(os.path.join(args.cache_dir, 'llm_cache.sqlite'),
+                    ttl_seconds=args.llm_cache_ttl_hours * 3600)
+
+def batch_main(args: argparse.Namespace):
+    """Run batch mode over a file of usernames"""
+    usernames = read_user_list(args.batch)
+    if not usernames:
+        print(f"Error: No usernames found in {args.batch}")
+        return
+    
+    print(f"Profiling {len(usernames)} users ({args.concurrency} at a time)")
+    interest_matcher = load_interest_matcher(args.taxonomy)
+    metrics = Metrics()
+    store = ItemStore(args.item_store) if args.item_store else None
+    cpu_pool = create_cpu_pool(args.processes, interest_matcher) if args.processes > 0 else None
+    scraper = RedditScraper(max_pages=args.max_pages, max_items=args.max_items,
+                            max_age_days=args.max_age_days, backend=args.backend,
+                            cache=create_response_cache(args), store=store,
+                            transport=create_transport(args, pool_size=args.per_host),
+                            limiter=HostLimiter(per_host=args.per_host, rate=args.host_rps), parse_pool=cpu_pool,
+                            metrics=metrics)
+    analyzer = PersonaAnalyzer(llm_cache=create_llm_cache(args), sample_tokens=args.sample_tokens,
+                               map_reduce=args.map_reduce, chunk_tokens=args.chunk_tokens,
+                               interest_matcher=interest_matcher, cpu_pool=cpu_pool, metrics=metrics,
+                               item_store=store,
+                               rate_limiter=RateLimiter(args.llm_rpm / 60, burst=args.analysis_workers))
+    reporter = PersonaReporter(output_format=args.format, output_path=args.output, metrics=metrics)
+    queue = BatchQueue(args.progress or f"{args.batch}.progress.sqlite", max_attempts=args.max_attempts)
+    if args.restart:
+        queue.reset()
+    try:
+        results = asyncio.run(run_batch(usernames, scraper, analyzer, reporter,
+                                        concurrency=args.concurrency, llm_batch_size=args.llm_batch_size,
+                                        llm_batch_tokens=args.llm_batch_tokens,
+                                        analysis_workers=max(args.analysis_workers, args.processes),
+                                        queue=queue))
+    finally:
+        reporter.close()
+        queue.close()
+        scraper.transport.close()
+        if cpu_pool is not None:
+            cpu_pool.shutdown()
+        if args.metrics_file:
+            metrics.save(args.metrics_file)
+    
+    failed = [username for username, filename in results.items() if not filename]
+    print(f"\nProfiled {len(results) - len(failed)}/{len(usernames)} users")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+
+def cohort_main(args: argparse.Namespace):
+    """Run cohort analytics over the users stored in the item store"""
+    if not args.item_store:
+        print("Error: --cohort needs --item-store (scrape the users into it first)")
+        return
+    
+    store = ItemStore(args.item_store)
+    try:
+        table = store.load_cohort(read_user_list(args.batch) if args.batch else None)
+    finally:
+        store.close()
+    if not table.usernames:
+        print("Error: No stored users to analyze")
+        return
+    
+    print(f"Analyzing a cohort of {len(table.usernames)} users ({len(table)} posts/comments)")
+    features = CohortAnalyzer().features(table)
+    
+    print(f"\n{'feature':<24}" + ''.join(f"{f'p{p}':>10}" for p in COHORT_PERCENTILES))
+    for name, values in features.percentiles().items():
+        print(f"{name:<24}" + ''.join(f"{values[p]:>10.2f}" for p in COHORT_PERCENTILES))
+    print()
+    features.save_csv(args.output or f"cohort_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+
 def main():
     """Main function"""
+    args = parse_args()
+    
     print("Reddit User Persona Generator")
     print("=" * 50)
     
+    if args.cohort:
+        cohort_main(args)
+        return
+    
+    if args.batch:
+        batch_main(args)
+        return
+    
     # Get user input
-    user_input = input("Enter Reddit user URL or username: ").strip()
+    user_input = (args.user or input("Enter Reddit user URL or username: ")).strip()
     
     if not user_input:
         print("Error: Please provide a Reddit user URL or username")
@@ -724,9 +3636,17 @@ def main():
     print(f"Analyzing user: u/{username}")
     
     # Initialize components
-    scraper = RedditScraper()
-    analyzer = PersonaAnalyzer()
-    reporter = PersonaReporter()
+    metrics = Metrics()
+    store = ItemStore(args.item_store) if args.item_store else None
+    scraper = RedditScraper(max_pages=args.max_pages, max_items=args.max_items,
+                            max_age_days=args.max_age_days, backend=args.backend,
+                            cache=create_response_cache(args), store=store, metrics=metrics,
+                            transport=create_transport(args), limiter=HostLimiter(rate=args.host_rps))
+    analyzer = PersonaAnalyzer(llm_cache=create_llm_cache(args), sample_tokens=args.sample_tokens,
+                               map_reduce=args.map_reduce, chunk_tokens=args.chunk_tokens,
+                               interest_matcher=load_interest_matcher(args.taxonomy), metrics=metrics,
+                               item_store=store)
+    reporter = PersonaReporter(output_format=args.format, output_path=args.output, metrics=metrics)
     
     try:
         # Scrape user data
@@ -760,6 +3680,11 @@ def main():
     except Exception as e:
         print(f"Error: {e}")
         print("Please check the username and try again.")
+    finally:
+        reporter.close()
+        scraper.transport.close()
+        if args.metrics_file:
+            metrics.save(args.metrics_file)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,217 @@
+"""Killing and resuming batch runs across the pending/scraped/analyzed/failed checkpoints"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+import requests
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+import main
+from main import (AnalysisFailed, BatchQueue, PersonaAnalyzer, PersonaReporter, PostType,
+                  RedditPost, RedditScraper, ScrapeFailed, UserPersona)
+
+
+class Killed(BaseException):
+    """Stands in for the process being killed mid-run"""
+
+
+def make_posts(username, count=3):
+    return [RedditPost(content=f"{username} comment {i}", subreddit='python', score=i,
+                       timestamp='2024-01-01T00:00:00+00:00', post_type=PostType.COMMENT,
+                       url=f"https://www.reddit.com/r/python/comments/{username}{i}/")
+            for i in range(count)]
+
+
+def make_persona(username):
+    return UserPersona(username=username, personality_traits=['Curious'], interests=['Programming'],
+                       communication_style='Terse', activity_patterns={}, psychological_profile={},
+                       citations={})
+
+
+class StubScraper:
+    """Records which users were fetched; fails users listed in fail"""
+
+    store = None
+
+    def __init__(self, fail=(), scraped_all=None, last=None):
+        self.calls = []
+        self.fail = set(fail)
+        self.scraped_all = scraped_all
+        self.last = last
+
+    def get_user_data(self, username):
+        self.calls.append(username)
+        if username in self.fail:
+            raise ScrapeFailed(f"No complete answer for u/{username}")
+        if username == self.last and self.scraped_all:
+            self.scraped_all.set()
+        return make_posts(username)
+
+
+class StubAnalyzer:
+    """Records analyzed users; kills the run or fails the LLM for selected users"""
+
+    def __init__(self, kill=None, fail=(), before_kill=None):
+        self.calls = []
+        self.kill = kill
+        self.fail = set(fail)
+        self.before_kill = before_kill
+
+    def analyze_user(self, username, posts, llm_analysis=None, strict=False):
+        self.calls.append(username)
+        if username == self.kill:
+            if self.before_kill:
+                self.before_kill.wait(5)
+                time.sleep(0.05)
+            raise Killed()
+        if username in self.fail and strict:
+            raise AnalysisFailed(f"No LLM analysis for u/{username}")
+        return make_persona(username)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(main, 'BATCH_RETRY_DELAY', 0.0)
+
+
+@pytest.fixture
+def reporter(tmp_path):
+    reporter = PersonaReporter(output_format='jsonl', output_path=str(tmp_path / 'personas.jsonl'))
+    yield reporter
+    reporter.close()
+
+
+def run(usernames, scraper, analyzer, reporter, queue):
+    return asyncio.run(main.run_batch(usernames, scraper, analyzer, reporter, concurrency=1,
+                                      analysis_workers=1, queue=queue))
+
+
+def states(queue, usernames):
+    return {username: state for username, (state, _) in queue.enqueue(usernames).items()}
+
+
+def test_killed_run_resumes_from_checkpoints(tmp_path, reporter):
+    path = str(tmp_path / 'progress.sqlite')
+    users = ['a', 'b', 'c', 'd']
+
+    scraped_all = threading.Event()
+    queue = BatchQueue(path)
+    with pytest.raises(Killed):
+        run(users, StubScraper(scraped_all=scraped_all, last='d'),
+            StubAnalyzer(kill='c', before_kill=scraped_all), reporter, queue)
+    assert states(queue, users) == {'a': 'reported', 'b': 'reported', 'c': 'scraped', 'd': 'scraped'}
+
+    scraper = StubScraper()
+    analyzer = StubAnalyzer()
+    results = run(users, scraper, analyzer, reporter, BatchQueue(path))
+    assert sorted(scraper.calls) == ['c', 'd']
+    assert sorted(analyzer.calls) == ['c', 'd']
+    assert all(results[username] for username in users)
+    assert set(states(queue, users).values()) == {'reported'}
+
+
+@pytest.mark.skipif(pq is None, reason="pyarrow is not installed")
+def test_killed_parquet_run_keeps_reported_personas(tmp_path):
+    path = str(tmp_path / 'progress.sqlite')
+    output = str(tmp_path / 'personas.parquet')
+    users = ['a', 'b', 'c', 'd']
+
+    # Killed before close(): a and b fill a row group, c is still buffered
+    scraped_all = threading.Event()
+    queue = BatchQueue(path)
+    with pytest.raises(Killed):
+        run(users, StubScraper(scraped_all=scraped_all, last='d'),
+            StubAnalyzer(kill='d', before_kill=scraped_all),
+            PersonaReporter(output_format='parquet', output_path=output, row_group_size=2), queue)
+    assert states(queue, users) == {'a': 'reported', 'b': 'reported', 'c': 'analyzed', 'd': 'scraped'}
+    assert sorted(pq.read_table(output).column('username').to_pylist()) == ['a', 'b']
+
+    reporter = PersonaReporter(output_format='parquet', output_path=output, row_group_size=2)
+    scraper = StubScraper()
+    run(users, scraper, StubAnalyzer(), reporter, BatchQueue(path))
+    reporter.close()
+    assert scraper.calls == ['d']
+    assert sorted(pq.read_table(output).column('username').to_pylist()) == users
+    assert set(states(queue, users).values()) == {'reported'}
+
+
+def test_analyzed_users_are_only_reported(tmp_path, reporter):
+    queue = BatchQueue(str(tmp_path / 'progress.sqlite'))
+    queue.enqueue(['a', 'b', 'c'])
+    queue.mark_scraped('a')
+    queue.mark_analyzed('a', make_persona('a'))
+    queue.mark_scraped('b')
+    queue.mark_analyzed('b', make_persona('b'))
+    queue.mark_reported('b', 'persona_b.txt')
+
+    scraper = StubScraper()
+    analyzer = StubAnalyzer()
+    results = run(['a', 'b', 'c'], scraper, analyzer, reporter, queue)
+    assert scraper.calls == ['c'] and analyzer.calls == ['c']
+    assert results['b'] == 'persona_b.txt'
+    assert states(queue, ['a', 'b', 'c']) == {'a': 'reported', 'b': 'reported', 'c': 'reported'}
+
+
+def test_failed_scrapes_are_retried_then_given_up(tmp_path, reporter):
+    queue = BatchQueue(str(tmp_path / 'progress.sqlite'), max_attempts=2)
+    scraper = StubScraper(fail=['b'])
+    results = run(['a', 'b'], scraper, StubAnalyzer(), reporter, queue)
+    assert scraper.calls.count('b') == 2
+    assert results['a'] and results['b'] is None
+    assert states(queue, ['a', 'b']) == {'a': 'reported', 'b': 'failed'}
+
+    # Failed users are skipped by later runs
+    scraper = StubScraper()
+    results = run(['a', 'b'], scraper, StubAnalyzer(), reporter, queue)
+    assert scraper.calls == [] and results['b'] is None
+
+
+def test_llm_failure_is_not_checkpointed_as_reported(tmp_path, reporter):
+    path = str(tmp_path / 'progress.sqlite')
+    queue = BatchQueue(path)
+    results = run(['a', 'b'], StubScraper(), StubAnalyzer(fail=['b']), reporter, queue)
+    assert results['a'] and results['b'] is None
+    assert states(queue, ['a', 'b']) == {'a': 'reported', 'b': 'scraped'}
+
+    analyzer = StubAnalyzer()
+    results = run(['a', 'b'], StubScraper(), analyzer, reporter, queue)
+    assert analyzer.calls == ['b'] and results['b']
+
+
+class FailingClient:
+    """Gemini client whose requests always fail"""
+
+    def __init__(self):
+        self.models = self
+        self.calls = 0
+
+    def generate_content(self, model, contents):
+        self.calls += 1
+        raise RuntimeError("connection reset")
+
+
+def test_strict_analysis_raises_on_llm_failure(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'test')
+    analyzer = PersonaAnalyzer(client=FailingClient())
+    posts = make_posts('a')
+    with pytest.raises(AnalysisFailed):
+        analyzer.analyze_user('a', posts, strict=True)
+    assert analyzer.analyze_user('a', posts).personality_traits == []
+    assert analyzer.analyze_users({'a': posts, 'b': make_posts('b')}, strict=True) == {}
+
+
+class UnreachableTransport:
+    def get(self, url, headers=None):
+        raise requests.ConnectionError(f"Connection refused: {url}")
+
+
+def test_unreachable_hosts_raise_scrape_failed():
+    scraper = RedditScraper(transport=UnreachableTransport())
+    with pytest.raises(ScrapeFailed):
+        scraper.get_user_data('someone')
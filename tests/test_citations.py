@@ -0,0 +1,25 @@
+"""Citing posts for the heuristic interests and traits"""
+
+from main import HeuristicAnalyzer, PostColumns, PostType, RedditPost
+
+
+def comment(i, text, subreddit):
+    return RedditPost(content=text, subreddit=subreddit, score=1,
+                      timestamp=f"2024-01-{1 + i % 28:02d}T00:00:00+00:00", post_type=PostType.COMMENT,
+                      url=f"https://www.reddit.com/c{i}/", fullname=f"t1_{i}")
+
+
+def test_interests_cite_posts_of_their_subreddits():
+    posts = [comment(0, "finally got my first loop working, recursion next", 'learnprogramming'),
+             comment(1, "new GPU arrived, frame rates are great", 'pcgaming'),
+             comment(2, "what do you think about gaming chairs", 'AskReddit'),
+             comment(3, "tomatoes are ripening early this year", 'gardening')]
+    analyzer = HeuristicAnalyzer()
+    interests = ['Programming', 'Gaming']
+
+    for source in (posts, PostColumns.from_posts(posts)):
+        citations = analyzer._generate_citations(source, [], interests)
+        assert citations["Interest: Programming"][0].startswith("[comment] in r/learnprogramming")
+        # Posts of the mapped subreddit rank ahead of other word matches
+        assert [line.split(':')[0] for line in citations["Interest: Gaming"]] == [
+            "[comment] in r/pcgaming", "[comment] in r/AskReddit"]
@@ -0,0 +1,81 @@
+"""Keying and merging of stored items"""
+
+import sqlite3
+
+from main import ActivityHistogram, ItemStore, PostType, RedditPost, _post_from_json
+
+ARTICLE = 'https://example.com/article'
+
+
+def link_post(fullname, created_utc, title):
+    return _post_from_json({'kind': 't3', 'data': {
+        'name': fullname, 'title': title, 'url': ARTICLE, 'subreddit_name_prefixed': 'r/news',
+        'created_utc': created_utc, 'permalink': f"/r/news/comments/{fullname[3:]}/"}},
+        'https://www.reddit.com/user/someone/submitted.json')
+
+
+def test_link_posts_to_the_same_url_are_kept_apart(tmp_path):
+    store = ItemStore(str(tmp_path / 'items.sqlite'))
+    older = link_post('t3_aaa', 1_700_000_000, 'First share')
+    store.add('someone', [older])
+
+    newer = link_post('t3_bbb', 1_700_100_000, 'Second share')
+    assert newer.url == older.url
+    assert 't3_bbb' not in store.known_keys('someone')
+    store.add('someone', [newer])
+
+    assert sorted(post.title for post in store.load('someone')) == ['First share', 'Second share']
+    assert store.load_activity('someone').count == 2
+
+
+def test_rows_keyed_by_url_are_rekeyed(tmp_path):
+    path = str(tmp_path / 'items.sqlite')
+    post = link_post('t3_aaa', 1_700_000_000, 'First share')
+
+    # A store written before items were keyed by fullname
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (username TEXT NOT NULL, item_key TEXT NOT NULL, content TEXT NOT NULL, "
+                 "subreddit TEXT NOT NULL, score INTEGER NOT NULL, timestamp TEXT NOT NULL, "
+                 "post_type TEXT NOT NULL, url TEXT NOT NULL, title TEXT NOT NULL, "
+                 "created_utc INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (username, item_key))")
+    conn.execute("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                 ('someone', post.url, post.content, post.subreddit, post.score, post.timestamp,
+                  PostType.POST.value, post.url, post.title, post.created_utc))
+    conn.commit()
+    conn.close()
+
+    store = ItemStore(path)
+    store.add('someone', [post, link_post('t3_bbb', 1_700_100_000, 'Second share')])
+    assert store.known_keys('someone') == {'t3_aaa', 't3_bbb'}
+    assert [item.fullname for item in store.load('someone')] == ['t3_bbb', 't3_aaa']
+    assert store.load_activity('someone').count == 2
+
+
+def test_columns_match_loaded_posts(tmp_path, monkeypatch):
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    from main import PersonaAnalyzer
+
+    store = ItemStore(str(tmp_path / 'items.sqlite'))
+    posts = [RedditPost(content=f"comment {i} about python?", subreddit=['python', 'news'][i % 2], score=i,
+                        timestamp=f"2024-01-{1 + i % 28:02d}T00:00:00+00:00", post_type=PostType.COMMENT,
+                        url=f"https://www.reddit.com/r/python/comments/x/y/c{i}/", fullname=f"t1_c{i}")
+             for i in range(50)]
+    store.add('someone', posts + [link_post('t3_aaa', 1_700_000_000, 'A link')])
+
+    columns = store.load_columns('someone')
+    assert list(columns) == store.load('someone')
+
+    analyzer = PersonaAnalyzer()
+    assert analyzer.analyze_user('someone', columns) == analyzer.analyze_user('someone', store.load('someone'))
+
+
+def test_refreshed_activity_matches_a_histogram_of_all_items(tmp_path):
+    store = ItemStore(str(tmp_path / 'items.sqlite'))
+    posts = [link_post(f"t3_{i:03d}", 1_600_000_000 + i * 3 * 86400 + i * 3600, f"Share {i}") for i in range(200)]
+    store.add('someone', posts[:120])
+    # A refresh brings items that slide the daily window plus some already stored
+    store.add('someone', posts[100:])
+
+    stored = store.load_activity('someone')
+    expected = ActivityHistogram.from_posts(posts)
+    assert stored.to_bytes() == expected.to_bytes()
@@ -0,0 +1,86 @@
+"""Packing several users into one Gemini request"""
+
+import json
+
+import pytest
+
+from main import PersonaAnalyzer, _is_rate_limited
+
+
+class ScriptedClient:
+    """Gemini client answering every request with respond(prompt)"""
+
+    def __init__(self, respond):
+        self.models = self
+        self.respond = respond
+        self.prompts = []
+
+    def generate_content(self, model, contents):
+        self.prompts.append(contents)
+        text = self.respond(contents)
+        if isinstance(text, Exception):
+            raise text
+        return type('Response', (), {'text': text, 'usage_metadata': None})()
+
+
+SAMPLES = {f"user{i}": f"r/python: sample text of user {i}" for i in range(4)}
+
+
+def analysis(username):
+    return {'personality_traits': [f"trait of {username}"], 'communication_style': 'Terse',
+            'psychological_profile': {}}
+
+
+def users_in(prompt):
+    return [username for username in SAMPLES if f"=== USER {username} ===" in prompt
+            or SAMPLES[username] in prompt]
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'test')
+
+
+def test_failed_request_is_not_split():
+    client = ScriptedClient(lambda prompt: RuntimeError("quota exhausted"))
+    analyzer = PersonaAnalyzer(client=client)
+    assert analyzer._llm_analyze_batch(dict(SAMPLES)) == {}
+    assert len(client.prompts) == 1
+
+
+def test_unparseable_response_is_split_in_halves():
+    def respond(prompt):
+        users = users_in(prompt)
+        if len(users) > 2:
+            return "not json"
+        if len(users) == 1:
+            return json.dumps(analysis(users[0]))
+        return json.dumps({username: analysis(username) for username in users})
+
+    client = ScriptedClient(respond)
+    analyzer = PersonaAnalyzer(client=client)
+    results = analyzer._llm_analyze_batch(dict(SAMPLES))
+    assert sorted(results) == sorted(SAMPLES)
+    assert len(client.prompts) == 3
+
+
+def test_response_without_any_user_is_split():
+    def respond(prompt):
+        users = users_in(prompt)
+        if len(users) > 1:
+            return json.dumps({'someone else': analysis('someone else')})
+        return json.dumps(analysis(users[0]))
+
+    client = ScriptedClient(respond)
+    results = PersonaAnalyzer(client=client)._llm_analyze_batch(dict(SAMPLES))
+    assert sorted(results) == sorted(SAMPLES)
+
+
+@pytest.mark.parametrize('message, limited', [
+    ("429 RESOURCE_EXHAUSTED. Quota exceeded", True),
+    ("HTTP 429 Too Many Requests", True),
+    ("500 INTERNAL. request id 84290fa1", False),
+    ("timeout after 14293 ms", False),
+])
+def test_only_quota_errors_count_as_rate_limited(message, limited):
+    assert _is_rate_limited(RuntimeError(message)) == limited
@@ -0,0 +1,17 @@
+"""Splitting a long history into chunks for map-reduce analysis"""
+
+from main import PersonaAnalyzer, PostType, RedditPost
+
+
+def post(i, timestamp):
+    return RedditPost(content=f"comment number {i} " * 5, subreddit='python', score=1, timestamp=timestamp,
+                      post_type=PostType.COMMENT, url=f"https://www.reddit.com/c{i}/", fullname=f"t1_{i}")
+
+
+def test_history_chunks_are_stable_under_new_activity():
+    history = [post(i, f"2024-01-{1 + i:02d}T00:00:00+00:00") for i in range(20)] + [post(99, '')]
+    analyzer = PersonaAnalyzer(chunk_tokens=60)
+    before = analyzer._chunk_history(history)
+    after = analyzer._chunk_history(history + [post(20, '2024-01-25T12:00:00Z'), post(98, '')])
+    assert after[:len(before) - 2] == before[:-2]
+    assert 'comment number 99' in after[-1]
@@ -0,0 +1,21 @@
+"""Choosing the posts sent to the LLM"""
+
+from main import PostType, RedditPost, _estimate_tokens, _sample_line, select_sample
+
+
+def comment(i, text, subreddit='python', score=1):
+    return RedditPost(content=text, subreddit=subreddit, score=score,
+                      timestamp=f"2024-01-{1 + i % 28:02d}T00:00:00+00:00", post_type=PostType.COMMENT,
+                      url=f"https://www.reddit.com/c{i}/", fullname=f"t1_{i}")
+
+
+def test_sample_skips_near_duplicates_and_keeps_the_budget():
+    text = "the quick brown fox jumps over the lazy dog while the cat watches from the window"
+    posts = [comment(i, text + ("!" if i % 2 else ""), score=100) for i in range(10)]
+    posts += [comment(100 + i, f"unrelated thoughts number {i} on gardening and cooking pasta at home",
+                      subreddit='gardening') for i in range(5)]
+
+    sample = select_sample(posts, token_budget=200)
+    assert sum(post.content.startswith("the quick brown fox") for post in sample) == 1
+    assert sum(_estimate_tokens(_sample_line(post)) for post in sample) <= 200
+    assert [posts.index(post) for post in sample] == sorted(posts.index(post) for post in sample)
@@ -0,0 +1,190 @@
+"""Fetching listings: backend fallbacks and throttling"""
+
+import json
+
+import pytest
+import requests
+
+from main import HostLimiter, Metrics, RedditScraper, ScrapeFailed, _page_parser, _parse_page_task
+
+
+def make_response(url, status, body=b'', headers=None):
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response._content = body
+    response.headers.update(headers or {})
+    return response
+
+
+def json_listing(children=(), after=None):
+    return json.dumps({'kind': 'Listing', 'data': {'children': list(children), 'after': after}}).encode()
+
+
+class ScriptedTransport:
+    """Answers each GET with respond(url) and records the requested URLs"""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.urls = []
+
+    def get(self, url, headers=None):
+        self.urls.append(url)
+        status, body, headers = self.respond(url)
+        return make_response(url, status, body, headers)
+
+
+def scraper_for(respond, **kwargs):
+    transport = ScriptedTransport(respond)
+    return RedditScraper(transport=transport, base_urls=('https://old.reddit.com',), **kwargs), transport
+
+
+def test_throttled_json_listing_is_not_scraped_as_html():
+    scraper, transport = scraper_for(lambda url: (429, b'', {'Retry-After': '0'}))
+    with pytest.raises(ScrapeFailed):
+        scraper.get_user_data('someone')
+    assert transport.urls and all('.json' in url for url in transport.urls)
+
+
+def test_server_errors_are_retried():
+    answers = {}
+
+    def respond(url):
+        answers[url] = answers.get(url, 0) + 1
+        if answers[url] == 1:
+            return 503, b'', {'Retry-After': '0'}
+        return 200, json_listing(), {}
+
+    scraper, transport = scraper_for(respond)
+    assert scraper.get_user_data('someone') == []
+    assert len(transport.urls) == 4
+
+
+
+@pytest.mark.parametrize('limiter', [None, HostLimiter(rate=100)])
+def test_fetch_time_excludes_retry_waits(limiter):
+    answers = {}
+
+    def respond(url):
+        answers[url] = answers.get(url, 0) + 1
+        if answers[url] == 1:
+            return 503, b'', {'Retry-After': '0.2'}
+        # Compressed on the wire: Content-Length is smaller than the decoded body
+        return 200, json_listing(), {'Content-Length': '10'}
+
+    metrics = Metrics()
+    scraper, transport = scraper_for(respond, limiter=limiter, metrics=metrics)
+    scraper.get_user_data('someone')
+    stages = {sample['labels']['stage']: sample for sample in metrics.to_dict()['histograms']['stage_seconds']}
+    assert stages['fetch']['count'] == 4 and stages['fetch']['sum'] < 0.2
+    assert stages['wait']['sum'] >= 0.2
+    counters = {name: samples[0]['value'] for name, samples in metrics.to_dict()['counters'].items()}
+    assert counters['http_response_bytes_total'] == 20
+    assert counters['http_response_decoded_bytes_total'] == 2 * len(json_listing())
+
+def test_undecodable_json_listing_falls_back_to_html():
+    def respond(url):
+        if '.json' in url:
+            return 200, b'<html>not json</html>', {}
+        return 200, b'<html><body><div id="siteTable"></div></body></html>', {}
+
+    scraper, transport = scraper_for(respond)
+    assert scraper.get_user_data('someone') == []
+    assert any('.json' not in url for url in transport.urls)
+
+
+HTML_COMMENTS = (b'<html><body><div id="siteTable"><div class="thing comment" data-fullname="t1_abc">'
+                 b'<a class="subreddit">python</a><span class="score unvoted">3 points</span>'
+                 b'<time datetime="2024-01-01T00:00:00+00:00">ago</time>'
+                 b'<div class="usertext-body"><div class="md"><p>Hello there</p></div></div>'
+                 b'<a class="bylink" href="https://old.reddit.com/r/python/comments/x/y/abc/">permalink</a>'
+                 b'</div></div></body></html>')
+
+
+def test_refused_json_listing_falls_back_to_html():
+    def respond(url):
+        if '.json' in url:
+            return 403, b'', {}
+        if url.endswith('/comments'):
+            return 200, HTML_COMMENTS, {}
+        return 200, b'<html><body><div id="siteTable"></div></body></html>', {}
+
+    scraper, transport = scraper_for(respond)
+    posts = scraper.get_user_data('someone')
+    assert [post.fullname for post in posts] == ['t1_abc']
+
+
+def test_missing_profile_is_authoritative():
+    scraper, transport = scraper_for(lambda url: (404, b'', {}))
+    assert scraper.get_user_data('someone') == []
+    assert all('.json' in url for url in transport.urls)
+
+
+LISTING_PAGE = (b'<html><body><div class="side"><div class="thing link" data-fullname="t3_ad">'
+                b'<a class="title" href="https://ads.example.com/">Promoted</a></div></div>'
+                b'<div id="siteTable">'
+                b'<div class="thing link" data-fullname="t3_one"><div class="score unvoted">12</div>'
+                b'<a class="title" href="https://example.com/article">An article</a>'
+                b'<a class="subreddit">r/news</a><time datetime="2024-01-02T00:00:00+00:00">ago</time></div>'
+                b'<div class="thing link" data-fullname="t3_two"><div class="score unvoted">3</div>'
+                b'<a class="title" href="/r/python/comments/two/">A question</a><a class="subreddit">r/python</a>'
+                b'<time datetime="2024-01-01T00:00:00+00:00">ago</time>'
+                b'<div class="usertext-body"><div class="md"><p>How do I <b>parse</b> this?</p></div></div></div>'
+                b'<div class="nav-buttons"><span class="next-button"><a href="/user/x/submitted?after=t3_two">next</a>'
+                b'</span></div></div></body></html>')
+
+
+def test_fast_html_parse_matches_full_parse_within_site_table():
+    fast = RedditScraper(transport=ScriptedTransport(None))
+    full = RedditScraper(transport=ScriptedTransport(None), fast_html=False)
+    fast_items, fast_next = fast._parse_html_page(LISTING_PAGE, fast._parse_posts_page)
+    full_items, full_next = full._parse_html_page(LISTING_PAGE, full._parse_posts_page)
+
+    # Things outside #siteTable are not the user's activity and are left out on purpose
+    assert [item.fullname for item in full_items] == ['t3_ad', 't3_one', 't3_two']
+    assert fast_items == full_items[1:]
+    assert fast_next == full_next
+
+
+def test_page_without_site_table_is_parsed_in_full():
+    page = LISTING_PAGE.replace(b'id="siteTable"', b'id="other"')
+    fast = RedditScraper(transport=ScriptedTransport(None))
+    full = RedditScraper(transport=ScriptedTransport(None), fast_html=False)
+    assert (fast._parse_html_page(page, fast._parse_posts_page)
+            == full._parse_html_page(page, full._parse_posts_page))
+
+
+
+def test_worker_page_parser_opens_no_connections():
+    columns, next_url = _parse_page_task('_parse_posts_page', LISTING_PAGE, 'https://old.reddit.com/user/x/', True)
+    assert columns.fullnames == ['t3_one', 't3_two'] and next_url.endswith('after=t3_two')
+    assert _page_parser(True)._transport is None
+
+def comment_child(i):
+    return {'kind': 't1', 'data': {'name': f"t1_{i}", 'body': f"comment {i}", 'subreddit': 'python',
+                                   'score': 1, 'created_utc': 1_700_000_000 - i * 60,
+                                   'permalink': f"/r/python/comments/x/y/{i}/"}}
+
+
+def test_truncated_crawl_is_not_stored(tmp_path):
+    from main import ItemStore
+
+    failing = [True]
+
+    def respond(url):
+        if '/submitted' in url:
+            return 200, json_listing(), {}
+        if 'after=' not in url:
+            return 200, json_listing([comment_child(i) for i in range(100)], after='t1_99'), {}
+        if failing[0]:
+            return 500, b'', {}
+        return 200, json_listing([comment_child(i) for i in range(100, 150)]), {}
+
+    store = ItemStore(str(tmp_path / 'items.sqlite'))
+    scraper, transport = scraper_for(respond, store=store, max_items=200, max_pages=4)
+    with pytest.raises(ScrapeFailed):
+        scraper.get_user_data('someone')
+    assert store.known_keys('someone') == set()
+
+    failing[0] = False
+    assert len(scraper.get_user_data('someone')) == 150